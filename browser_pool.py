@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+browser_pool.py – Pool de navegadores Chrome (selenium-wire) reutilizables
+
+Arrancar Chrome + el proxy de selenium-wire cuesta varios segundos, así que en
+lugar de abrir y cerrar un navegador por cada página se mantienen hasta
+``size`` drivers vivos durante toda la ejecución:
+
+* ``checkout()`` entrega un driver libre (lanzándolo si todavía no existe).
+* ``checkin(driver, failed=False)`` lo devuelve limpio al pool.
+* Entre usos se borran las peticiones capturadas (``driver.requests`` o el
+  hook ``clear_captures``), cookies y pestañas extra.
+* Un driver se recicla (``quit`` + uno nuevo) tras ``max_pages`` usos o si
+  el uso terminó con error.
+
+Uso:
+    pool = BrowserPool(init_driver, size=2)
+    with pool.driver() as drv:
+        drv.get(url)
+    pool.close()
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class BrowserPool:
+    """Pool acotado de drivers con API checkout/checkin."""
+
+    def __init__(self, factory: Callable[[], object], size: int = 2, max_pages: int = 25,
+                 clear_captures: Optional[Callable[[object], None]] = None):
+        self.factory = factory
+        self.clear_captures = clear_captures
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self._idle: deque = deque()
+        self._lock = threading.Lock()
+        # Avisa a quien espera en checkout() que hay un driver libre o cupo para lanzar uno
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self._pages: Dict[int, int] = {}
+        self._all: List[object] = []
+        self._closed = False
+
+    # ───────────── Ciclo de vida ─────────────
+
+    def _launch(self):
+        driver = self.factory()
+        with self._lock:
+            self._pages[id(driver)] = 0
+            self._all.append(driver)
+        return driver
+
+    def _retire(self, driver) -> None:
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            if driver in self._all:
+                self._all.remove(driver)
+            self._created -= 1
+            self._available.notify()
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _reset(self, driver) -> None:
+        """Deja el driver como recién abierto: sin requests, cookies ni pestañas extra."""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.switch_to.default_content()
+        try:
+            driver.get("about:blank")
+        except Exception:
+            pass
+        # delete_all_cookies() solo borra las del documento actual (about:blank
+        # no tiene ninguna): CDP borra las de todos los sitios
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        if self.clear_captures is not None:
+            self.clear_captures(driver)
+        elif hasattr(driver, "requests"):
+            del driver.requests
+
+    # ───────────── API pública ─────────────
+
+    def checkout(self, timeout: Optional[float] = None):
+        """Devuelve un driver libre; lanza uno nuevo si hay cupo, si no espera
+        (a lo sumo ``timeout`` segundos: ``queue.Empty``) a que se libere uno
+        o a que se recicle alguno y quede cupo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("BrowserPool cerrado")
+                if self._idle:
+                    return self._idle.popleft()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._available.wait(remaining)
+        try:
+            return self._launch()
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+    def checkin(self, driver, failed: bool = False) -> None:
+        """Devuelve el driver al pool, reciclándolo si falló o llegó a ``max_pages``."""
+        with self._lock:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+            pages = self._pages[id(driver)]
+        if self._closed or failed or pages >= self.max_pages:
+            self._retire(driver)
+            return
+        try:
+            self._reset(driver)
+        except Exception:
+            self._retire(driver)
+            return
+        with self._available:
+            self._idle.append(driver)
+            self._available.notify()
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None) -> Iterator[object]:
+        """Context manager: checkout al entrar, checkin al salir (failed si hubo excepción)."""
+        drv = self.checkout(timeout)
+        failed = False
+        try:
+            yield drv
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.checkin(drv, failed=failed)
+
+    def close(self) -> None:
+        """Cierra todos los drivers lanzados por el pool."""
+        with self._available:
+            self._closed = True
+            drivers = list(self._all)
+            self._idle.clear()
+            self._available.notify_all()  # los que esperan en checkout() salen con error
+        for drv in drivers:
+            self._retire(drv)
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -34,11 +34,10 @@ Requisitos:
 from __future__ import annotations
 
 import re
-import time
+import threading
 from pathlib import Path
 from typing import Optional, List, Tuple
 
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 
@@ -48,6 +47,14 @@ from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 
+from dash_manifest import best_mpd, derive_hls_from_mpd
+from http_pool import close_session, fetch, run_parallel
+from liveness import probe_stream
+from iframe_crawler import crawl
+from stream_cache import StreamCache
+from capture import (MANIFEST_SCOPES, configure_interception, quiet_chrome,
+                     seleniumwire_options, wait_for_manifest)
+
 # ---------------------------------------------------------------------------
 # Configuración editable
 # ---------------------------------------------------------------------------
@@ -64,6 +71,11 @@ HEADERS = {
 
 SALIDA = Path(__file__).with_name("varios.m3u")
 LOGS = Path(__file__).with_name("debug_requests.log")
+# Streams capturados por página, vigentes hasta su vencimiento (ver stream_cache.py)
+CACHE = StreamCache(Path(__file__).with_name(".varios_cache.json"))
+# True: selenium-wire guarda todas las peticiones (debug_requests.log completo)
+LOG_ALL_REQUESTS = False
+SLOW_WAIT = 8  # segundos máximos esperando el manifiesto en Chromium
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -88,13 +100,15 @@ def extract_iframe(html: str) -> Optional[str]:
     tag = soup.find("iframe", src=True)
     return normalize(tag["src"]) if tag else None
 
-def m3u8_quick(iframe_url: str) -> Optional[str]:
-    try:
-        txt = requests.get(iframe_url, headers=HEADERS, timeout=10).text
-        m = re.search(r'https?:[^\'"\s]+\.m3u8[^\'"\s]*', txt)
-        return m.group(0) if m else None
-    except Exception:
+def m3u8_quick(page_url: str, html: Optional[str] = None) -> Optional[str]:
+    """Sigue por HTTP todos los iframes de la página (con Referer y los
+    decodificadores de ``decoders.py``) hasta dar con un .m3u8 (o un .mpd,
+    igual que el camino lento). Solo lo acepta si reproduce."""
+    hit = crawl(page_url, html=html)
+    if hit and not probe_stream({"url": hit["url"], "user_agent": HEADERS["User-Agent"]})["ok"]:
+        # Player de publicidad o URL fija vencida: que decida Chromium
         return None
+    return hit["url"] if hit else None
 
 # ---------------------------------------------------------------------------
 # Selenium‑wire (headless con sniffing de red)
@@ -107,9 +121,11 @@ def _chrome_options() -> Options:
     opts.add_argument("--no-sandbox")
     opts.add_argument("--mute-audio")
     opts.add_argument("--disable-dev-shm-usage")
+    quiet_chrome(opts)
     return opts
 
 _DRIVER: Optional[webdriver.Chrome] = None
+_DRIVER_LOCK = threading.Lock()
 
 def _init_driver() -> webdriver.Chrome:
     import os
@@ -129,19 +145,25 @@ def _init_driver() -> webdriver.Chrome:
         # Fallback to webdriver-manager
         service = Service(ChromeDriverManager().install())
     
-    driver = webdriver.Chrome(service=service, options=opts)
-    driver.scopes = ['.*']
+    driver = webdriver.Chrome(service=service, options=opts,
+                              seleniumwire_options=seleniumwire_options())
+    configure_interception(driver, scopes=None if LOG_ALL_REQUESTS else MANIFEST_SCOPES)
     return driver
 
 def m3u8_slow(iframe_url: str) -> Optional[str]:
+    """Carga el iframe en Chromium (un solo driver compartido, de a un canal por vez)."""
     global _DRIVER
-    if _DRIVER is None:
-        _DRIVER = _init_driver()
-    driver = _DRIVER
+    with _DRIVER_LOCK:
+        if _DRIVER is None:
+            _DRIVER = _init_driver()
+        return _sniff_m3u8(_DRIVER, iframe_url)
 
+def _sniff_m3u8(driver: webdriver.Chrome, iframe_url: str) -> Optional[str]:
     try:
+        del driver.requests  # driver compartido: descartar capturas previas
         driver.get(iframe_url)
-        time.sleep(8)
+        # Espera hasta que el player pida un manifiesto (tope SLOW_WAIT)
+        wait_for_manifest(driver, SLOW_WAIT)
         lines = []
         for request in driver.requests:
             if request.response:
@@ -156,15 +178,14 @@ def m3u8_slow(iframe_url: str) -> Optional[str]:
                 print(f"  🔍 Found HLS stream: {request.url}")
                 return request.url
                 
-        # Si no encuentra .m3u8, buscar .mpd y usar el tokenizado más reciente
+        # Si no encuentra .m3u8, buscar .mpd y usar el tokenizado que vence más tarde
         dash_urls = []
         for request in driver.requests:
             if ".mpd" in request.url:
                 dash_urls.append(request.url)
                 
-        if dash_urls:
-            # Usar la URL tokenizada (la más larga es generalmente la más reciente)
-            best_dash = max(dash_urls, key=len)
+        best_dash = best_mpd(dash_urls)
+        if best_dash:
             print(f"  📺 Using DASH stream: {best_dash}")
             return best_dash
     except Exception as e:
@@ -172,33 +193,59 @@ def m3u8_slow(iframe_url: str) -> Optional[str]:
         return None
     return None
 
-def capture_m3u8(iframe_url: str) -> Optional[str]:
-    iframe_url = normalize(iframe_url)
-    return m3u8_quick(iframe_url) or m3u8_slow(iframe_url)
+def capture_m3u8(page_url: str, html: str) -> Optional[str]:
+    """Caché, luego crawl HTTP y solo si no alcanza, Chromium sobre el primer iframe."""
+    cached = CACHE.get(page_url)
+    if cached:
+        return cached["url"]
+    url = m3u8_quick(page_url, html)
+    if not url:
+        iframe = extract_iframe(html)
+        url = m3u8_slow(iframe) if iframe else None
+    if url:
+        CACHE.put(page_url, {"url": url})
+        CACHE.save()
+    return url
 
 # ---------------------------------------------------------------------------
 # Procesar cada canal
 # ---------------------------------------------------------------------------
 
 def process_channel(name: str, page_url: str) -> Optional[str]:
-    print(f"→ {name:<12} … ", end="", flush=True)
+    """Resuelve un canal. Se ejecuta en paralelo con los demás, por eso informa
+    el resultado en una sola línea al final."""
+    def report(status: str) -> None:
+        print(f"→ {name:<12} … {status}", flush=True)
+
     try:
-        html = requests.get(page_url, headers=HEADERS, timeout=15).text
+        html = fetch(page_url, headers=HEADERS, timeout=15).text
     except Exception as exc:
-        print(f"⚠️  {type(exc).__name__}")
+        report(f"⚠️  {type(exc).__name__}")
         return None
 
-    iframe = extract_iframe(html)
-    if not iframe:
-        print("sin iframe")
-        return None
-
-    m3u8 = capture_m3u8(iframe)
+    m3u8 = capture_m3u8(page_url, html)
     if not m3u8:
-        print("sin .m3u8")
+        report("sin .m3u8")
         return None
 
-    print("✔")
+    # si es DASH (.mpd), intentar derivar HLS
+    note = ""
+    if urlparse(m3u8).path.lower().endswith(".mpd"):
+        hls = derive_hls_from_mpd(m3u8, HEADERS)
+        if hls:
+            note = " (mpd→m3u8)"
+            m3u8 = hls
+        else:
+            note = " (mpd, sin hls)"
+
+    # No publicar streams que no reproducen (ver liveness.py)
+    health = probe_stream({"url": m3u8, "user_agent": HEADERS["User-Agent"]})
+    if not health["ok"]:
+        CACHE.drop(page_url)
+        CACHE.save()
+        report(f"✖ sin señal ({health['error']})")
+        return None
+    report(f"✔{note} {health['throughput'] // 1024} KB/s")
     return (
         f'#EXTINF:-1 tvg-name="{name}" group-title="Varios", {name}\n{m3u8}'
     )
@@ -217,12 +264,15 @@ def save_playlist(entries: List[str]) -> None:
 # ---------------------------------------------------------------------------
 
 def main() -> None:
-    entries: List[str] = []
-    for name, url in CANALES:
-        ent = process_channel(clean_spaces(name), url)
-        if ent:
-            entries.append(ent)
+    # Páginas y cadenas de iframes se descargan en paralelo; Chromium atiende de a uno
+    results = run_parallel([
+        lambda n=name, u=url: process_channel(clean_spaces(n), u) for name, url in CANALES
+    ])
+    entries: List[str] = [ent for ent in results if ent]
     save_playlist(entries)
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        close_session()
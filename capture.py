@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+capture.py – Espera y captura de manifiestos (.m3u8/.mpd) en el navegador
+
+* Esperas: en lugar de dormir un tiempo fijo después de cada ``driver.get`` o
+  clic, vuelven apenas se observa un manifiesto con respuesta 200/206 (o se
+  cumple la condición de DOM pedida), con un tope duro por etapa.
+* Intercepción: Chrome bloquea imágenes, fuentes, segmentos de video y hosts
+  de publicidad/telemetría antes de que lleguen al proxy de selenium-wire, y
+  el proxy solo guarda (con tope) las peticiones que parecen manifiestos.
+* Backends de captura: ``wire`` (proxy MITM de selenium-wire, por defecto) o
+  ``cdp`` (eventos ``Network.*`` del DevTools Protocol leídos de los logs de
+  performance de Chrome, sin proxy). Ambos exponen peticiones con ``url``,
+  ``headers`` y ``response.status_code``, así el resto del código no cambia.
+"""
+from __future__ import annotations
+
+import json
+import re
+import time
+from typing import Callable, Dict, List, Optional
+
+from requests.structures import CaseInsensitiveDict
+
+MANIFEST_EXTS = (".m3u8", ".mpd")
+OK_STATUS = (200, 206)
+POLL = 0.2  # segundos entre chequeos
+CAPTURE_BACKENDS = ("wire", "cdp")
+
+# Lo único que selenium-wire guarda (regex sobre la URL); el resto pasa sin almacenarse
+MANIFEST_SCOPES = [r"\.m3u8", r"\.mpd"]
+REQUEST_STORAGE_MAX = 200  # peticiones guardadas en memoria por driver
+
+# Extensiones que no hace falta descargar. Los comodines de setBlockedURLs
+# se comparan con la URL entera: "*.ico*" también bloquearía cdn.icons.../player.js,
+# así que cada extensión va anclada al final del path o antes de la query
+BLOCKED_EXTENSIONS = (
+    # imágenes y fuentes
+    "png", "jpg", "jpeg", "gif", "webp", "ico",
+    "woff", "woff2", "ttf", "otf",
+    # segmentos de video/audio (alcanza con el manifiesto)
+    "ts", "m4s", "aac",
+)
+# Patrones (comodines de Chrome) que se abortan en el navegador
+BLOCKED_URL_PATTERNS = [pattern for ext in BLOCKED_EXTENSIONS for pattern in (f"*.{ext}", f"*.{ext}?*")] + [
+    # publicidad y telemetría
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*adservice.google.*", "*cloudflareinsights.com*",
+    "*/cdn-cgi/rum*", "*connect.facebook.net*", "*hotjar.com*",
+]
+
+# Tráfico propio de Chrome (updates, sync, autofill, cuentas) que no aporta nada
+QUIET_CHROME_ARGS = [
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--no-first-run",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false",
+]
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def is_manifest(url: str) -> bool:
+    return any(ext in url for ext in MANIFEST_EXTS)
+
+
+def captured_requests(driver) -> List:
+    """Peticiones capturadas por el backend del driver (CDP o selenium-wire)."""
+    recorder = getattr(driver, "cdp_recorder", None)
+    if recorder is not None:
+        return recorder.requests
+    return driver.requests
+
+
+def clear_captures(driver) -> None:
+    """Descarta las peticiones capturadas hasta ahora."""
+    recorder = getattr(driver, "cdp_recorder", None)
+    if recorder is not None:
+        recorder.clear()
+    elif hasattr(driver, "requests"):
+        del driver.requests
+
+
+def manifest_requests(driver, ok_only: bool = True) -> List:
+    """Peticiones capturadas que son manifiestos (en orden)."""
+    found = []
+    for req in captured_requests(driver):
+        if not is_manifest(req.url):
+            continue
+        if ok_only and not (req.response and req.response.status_code in OK_STATUS):
+            continue
+        found.append(req)
+    return found
+
+# ---------------------------------------------------------------------------
+# Backend CDP (logs de performance)
+# ---------------------------------------------------------------------------
+
+class CdpResponse:
+    def __init__(self, status_code: int, headers: Optional[dict] = None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+
+
+class CdpRequest:
+    """Petición armada a partir de eventos ``Network.*`` (misma forma que selenium-wire)."""
+
+    def __init__(self, url: str, method: str, headers: dict):
+        self.url = url
+        self.method = method
+        self.headers = CaseInsensitiveDict(headers)
+        self.response: Optional[CdpResponse] = None
+
+
+class CdpRecorder:
+    """Acumula los manifiestos vistos en los logs de performance de un driver.
+
+    ``driver.get_log("performance")`` vacía el buffer en cada llamada, así que
+    los eventos se van procesando e incorporando en ``poll()``."""
+
+    def __init__(self, driver, match: Callable[[str], bool] = is_manifest):
+        self.driver = driver
+        self.match = match
+        self._requests: List[CdpRequest] = []
+        self._by_id: Dict[str, CdpRequest] = {}
+        self._extra: Dict[str, dict] = {}
+
+    def poll(self) -> None:
+        for entry in self.driver.get_log("performance"):
+            try:
+                msg = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            self._handle(msg.get("method", ""), msg.get("params", {}))
+
+    def _handle(self, method: str, params: dict) -> None:
+        rid = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            redirect = params.get("redirectResponse")
+            if redirect and rid in self._by_id:
+                prev = self._by_id[rid]
+                prev.response = CdpResponse(redirect.get("status", 0), redirect.get("headers"))
+            req = params.get("request", {})
+            url = req.get("url", "")
+            if not self.match(url):
+                self._by_id.pop(rid, None)
+                return
+            cdp_req = CdpRequest(url, req.get("method", "GET"), req.get("headers", {}))
+            # Cookie y demás cabeceras reales llegan en ExtraInfo (puede llegar antes)
+            cdp_req.headers.update(self._extra.pop(rid, {}))
+            self._by_id[rid] = cdp_req
+            self._requests.append(cdp_req)
+        elif method == "Network.requestWillBeSentExtraInfo":
+            headers = {k: v for k, v in params.get("headers", {}).items() if not k.startswith(":")}
+            if rid in self._by_id:
+                self._by_id[rid].headers.update(headers)
+            else:
+                self._extra[rid] = headers
+        elif method == "Network.responseReceived" and rid in self._by_id:
+            resp = params.get("response", {})
+            self._by_id[rid].response = CdpResponse(resp.get("status", 0), resp.get("headers"))
+
+    @property
+    def requests(self) -> List[CdpRequest]:
+        self.poll()
+        return list(self._requests)
+
+    def clear(self) -> None:
+        try:
+            self.driver.get_log("performance")
+        except Exception:
+            pass
+        self._requests.clear()
+        self._by_id.clear()
+        self._extra.clear()
+
+
+def enable_cdp_logging(opts) -> None:
+    """Pide a ChromeDriver los logs de performance (eventos Network.*)."""
+    opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def attach_cdp_recorder(driver) -> CdpRecorder:
+    driver.cdp_recorder = CdpRecorder(driver)
+    return driver.cdp_recorder
+
+# ---------------------------------------------------------------------------
+# Intercepción
+# ---------------------------------------------------------------------------
+
+def seleniumwire_options(max_requests: int = REQUEST_STORAGE_MAX) -> dict:
+    """Opciones para ``webdriver.Chrome(seleniumwire_options=...)``: almacenamiento
+    en memoria con tope de peticiones."""
+    return {
+        "request_storage": "memory",
+        "request_storage_max_size": max_requests,
+    }
+
+
+def quiet_chrome(opts) -> None:
+    """Agrega a ``opts`` los flags que apagan imágenes y tráfico de fondo de Chrome."""
+    for arg in QUIET_CHROME_ARGS:
+        opts.add_argument(arg)
+
+
+def configure_interception(driver, scopes: Optional[List[str]] = MANIFEST_SCOPES,
+                           blocked: Optional[List[str]] = BLOCKED_URL_PATTERNS) -> None:
+    """Limita lo que guarda selenium-wire a ``scopes`` (None = todo) y bloquea
+    ``blocked`` en el navegador vía CDP (``Network.setBlockedURLs``)."""
+    if hasattr(driver, "cdp_recorder"):
+        scopes = list(scopes or [])
+        driver.cdp_recorder.match = lambda url: not scopes or any(re.search(sc, url) for sc in scopes)
+    else:
+        driver.scopes = list(scopes) if scopes else []
+    if blocked:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(blocked)})
+        except Exception as e:
+            print(f"Warning: no se pudo activar el bloqueo de URLs: {e}")
+
+# ---------------------------------------------------------------------------
+# Esperas
+# ---------------------------------------------------------------------------
+
+def wait_until(predicate: Callable[[], object], timeout: float, poll: float = POLL):
+    """Evalúa ``predicate`` hasta que devuelva algo truthy o venza ``timeout``.
+    Devuelve el último valor (falsy si venció el plazo). Las excepciones del
+    predicado cuentan como "todavía no"."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            value = predicate()
+        except Exception:
+            value = None
+        if value or time.monotonic() >= deadline:
+            return value
+        time.sleep(min(poll, max(0.0, deadline - time.monotonic())))
+
+
+def wait_for_manifest(driver, timeout: float, ok_only: bool = True) -> List:
+    """Espera hasta ``timeout`` segundos a que aparezca un manifiesto en la red.
+    Devuelve las peticiones de manifiesto vistas (lista vacía si no hubo)."""
+    return wait_until(lambda: manifest_requests(driver, ok_only), timeout) or []
+
+
+def wait_for_js(driver, script: str, timeout: float) -> bool:
+    """Espera a que ``script`` (JS que hace ``return <bool>``) sea verdadero."""
+    return bool(wait_until(lambda: driver.execute_script(script), timeout))
+
+
+def wait_for_page(driver, timeout: float, condition_js: Optional[str] = None) -> bool:
+    """Espera ``document.readyState == 'complete'`` y, si se indica, la condición JS extra."""
+    script = "return document.readyState === 'complete'"
+    if condition_js:
+        script += f" && ({condition_js})"
+    return wait_for_js(driver, script, timeout)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+dash_manifest.py – Lectura de manifiestos DASH (.mpd) y derivación de su variante HLS
+
+``parse_mpd`` lee el XML del manifiesto (períodos, adaptation sets,
+representaciones, ``BaseURL`` heredadas y ``SegmentTemplate``) y devuelve
+dicts planos, para elegir entre varios .mpd capturados o sondear segmentos.
+
+``derive_hls_from_mpd`` busca la versión HLS del mismo stream: genera los
+candidatos de todas las reglas de ``HLS_RULES`` (sobre la URL original, la
+final tras redirecciones —la tokenizada— y la ``BaseURL`` del manifiesto), los
+sondea todos en paralelo y gana el primero que responde un playlist. La regla
+que funcionó se recuerda por host (``HlsRuleMemory``) y en las corridas
+siguientes se prueba sola primero.
+"""
+from __future__ import annotations
+
+import posixpath
+import re
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from http_pool import fetch, first_success
+from stream_cache import HlsRuleMemory, url_expiry
+
+PROBE_TIMEOUT = 5  # segundos por candidato
+RULES_FILE = Path(__file__).with_name(".hls_rules.json")
+
+TEMPLATE_RE = re.compile(r"\$(RepresentationID|Number|Bandwidth|Time)(?:%0(\d+)d)?\$")
+DURATION_RE = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?$")
+LIVE_EDGE_LAG = 2  # en vivo, sondear este número de segmentos antes del último publicado
+
+# ---------------------------------------------------------------------------
+# Parser MPD
+# ---------------------------------------------------------------------------
+
+def _name(el) -> str:
+    return el.tag.rsplit("}", 1)[-1]
+
+
+def _children(el, name: str) -> list:
+    return [c for c in el if _name(c) == name]
+
+
+def _child(el, name: str):
+    found = _children(el, name)
+    return found[0] if found else None
+
+
+def _base(el, parent: str) -> str:
+    node = _child(el, "BaseURL")
+    if node is None or not (node.text or "").strip():
+        return parent
+    return urljoin(parent, node.text.strip())
+
+
+def _template(el, inherited: Optional[dict]) -> Optional[dict]:
+    """``SegmentTemplate`` de ``el`` combinado con el heredado del nivel superior."""
+    node = _child(el, "SegmentTemplate")
+    if node is None:
+        return inherited
+    tpl = dict(inherited or {})
+    tpl.update(node.attrib)
+    timeline = _child(node, "SegmentTimeline")
+    if timeline is not None:
+        tpl["timeline"] = [
+            (int(s.get("t", -1)), int(s.get("d", 0)), int(s.get("r", 0)))
+            for s in _children(timeline, "S")
+        ]
+    return tpl
+
+
+def _int(value, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _seconds(value: Optional[str]) -> float:
+    """Duración ISO 8601 (``PT1H2M3.5S``) -> segundos; 0 si no se entiende."""
+    m = DURATION_RE.match((value or "").strip())
+    if not m:
+        return 0.0
+    days, hours, minutes, secs = (float(g) if g else 0.0 for g in m.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + secs
+
+
+def _epoch(value: Optional[str]) -> Optional[float]:
+    """Fecha ISO 8601 (``availabilityStartTime``) -> epoch, o None."""
+    try:
+        return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_mpd(xml: str, url: str) -> dict:
+    """XML de un .mpd -> ``{"type", "base_url", "periods": [{"id", "base_url",
+    "adaptation_sets": [{"content_type", "mime_type", "lang", "base_url",
+    "representations": [{"id", "bandwidth", "width", "height", "codecs",
+    "mime_type", "base_url", "template", "live", "live_start"}]}]}]}``.
+    ``live_start`` es el epoch del segmento ``startNumber`` de un manifiesto
+    dinámico (``availabilityStartTime`` + inicio del período) o None.
+    Lanza ``ET.ParseError`` si no es XML."""
+    root = ET.fromstring(xml.encode("utf-8") if isinstance(xml, str) else xml)
+    mpd_base = _base(root, url)
+    live = root.get("type", "static") == "dynamic"
+    available = _epoch(root.get("availabilityStartTime")) if live else None
+    periods = []
+    for period in _children(root, "Period"):
+        period_base = _base(period, mpd_base)
+        live_start = available + _seconds(period.get("start")) if available is not None else None
+        period_tpl = _template(period, None)
+        sets = []
+        for aset in _children(period, "AdaptationSet"):
+            set_base = _base(aset, period_base)
+            set_tpl = _template(aset, period_tpl)
+            mime = aset.get("mimeType", "")
+            reps = []
+            for rep in _children(aset, "Representation"):
+                reps.append({
+                    "id": rep.get("id", ""),
+                    "bandwidth": _int(rep.get("bandwidth")),
+                    "width": _int(rep.get("width", aset.get("width"))),
+                    "height": _int(rep.get("height", aset.get("height"))),
+                    "codecs": rep.get("codecs", aset.get("codecs", "")),
+                    "mime_type": rep.get("mimeType", mime),
+                    "base_url": _base(rep, set_base),
+                    "template": _template(rep, set_tpl),
+                    "live": live,
+                    "live_start": live_start,
+                })
+            sets.append({
+                "content_type": aset.get("contentType") or mime.split("/")[0],
+                "mime_type": mime,
+                "lang": aset.get("lang", ""),
+                "base_url": set_base,
+                "representations": reps,
+            })
+        periods.append({"id": period.get("id", ""), "base_url": period_base, "adaptation_sets": sets})
+    return {"type": root.get("type", "static"), "base_url": mpd_base, "periods": periods}
+
+
+def representations(mpd: dict, content_type: str = "video") -> List[dict]:
+    """Representaciones de ``content_type`` de todos los períodos, de mayor a menor bitrate."""
+    reps = [
+        rep
+        for period in mpd["periods"]
+        for aset in period["adaptation_sets"]
+        if aset["content_type"] == content_type
+        for rep in aset["representations"]
+    ]
+    return sorted(reps, key=lambda r: r["bandwidth"], reverse=True)
+
+
+def expand_template(pattern: str, rep: dict, number: Optional[int] = None, t: Optional[int] = None) -> str:
+    """Sustituye ``$RepresentationID$``, ``$Bandwidth$``, ``$Number%05d$``, ``$Time$`` y ``$$``."""
+    values = {"RepresentationID": rep.get("id", ""), "Bandwidth": rep.get("bandwidth", 0),
+              "Number": number, "Time": t}
+
+    def sub(m: re.Match) -> str:
+        value = values[m.group(1)]
+        if value is None:
+            return m.group(0)
+        return str(value).zfill(int(m.group(2))) if m.group(2) else str(value)
+
+    return TEMPLATE_RE.sub(sub, pattern).replace("$$", "$")
+
+
+def _timeline(timeline: list) -> List[int]:
+    """Tiempos de inicio de todos los segmentos de un ``SegmentTimeline``."""
+    times, t = [], 0
+    for start, duration, repeat in timeline:
+        t = start if start >= 0 else t
+        for _ in range(max(repeat, 0) + 1):
+            times.append(t)
+            t += duration
+    return times
+
+
+def _live_number(tpl: dict, live_start: Optional[float], now: Optional[float] = None) -> Optional[int]:
+    """``$Number$`` de un segmento ya publicado cerca del borde en vivo, a partir
+    de ``availabilityStartTime`` y ``duration``/``timescale``; None si faltan."""
+    duration = _int(tpl.get("duration")) / (_int(tpl.get("timescale"), 1) or 1)
+    if live_start is None or duration <= 0:
+        return None
+    published = int(((now or time.time()) - live_start) // duration)
+    return _int(tpl.get("startNumber"), 1) + max(0, published - LIVE_EDGE_LAG)
+
+
+def segment_urls(rep: dict, now: Optional[float] = None) -> Dict[str, Optional[str]]:
+    """``{"init", "first"}``: URLs del segmento de inicialización y de un
+    segmento de medios de ``rep`` (None si el template no alcanza para armarlas).
+    En un manifiesto estático es el primero; en uno dinámico, uno cercano al
+    borde en vivo: los primeros ya salieron del CDN y darían 404."""
+    tpl = rep.get("template") or {}
+    base = rep["base_url"]
+    init = tpl.get("initialization")
+    media = tpl.get("media")
+    live = rep.get("live", False)
+    first = None
+    if media:
+        times = _timeline(tpl.get("timeline") or [])
+        pick = max(0, len(times) - 1 - LIVE_EDGE_LAG) if live else 0
+        start_number = _int(tpl.get("startNumber"), 1)
+        if "$Time$" in media and times:
+            first = expand_template(media, rep, t=max(0, times[pick]))
+        elif "$Time$" not in media and times:
+            first = expand_template(media, rep, number=start_number + pick)
+        elif "$Time$" not in media and not live:
+            first = expand_template(media, rep, number=start_number)
+        elif "$Time$" not in media:
+            # Sin timeline no se sabe cuál está publicado sin el reloj del manifiesto;
+            # si no se puede calcular, se sondea el de inicialización
+            number = _live_number(tpl, rep.get("live_start"), now)
+            first = expand_template(media, rep, number=number) if number is not None else None
+    return {
+        "init": urljoin(base, expand_template(init, rep)) if init else None,
+        "first": urljoin(base, first) if first else None,
+    }
+
+
+def best_mpd(urls: List[str]) -> Optional[str]:
+    """Entre varios .mpd capturados del mismo player: el tokenizado que vence
+    más tarde; si ninguno trae token, el último pedido."""
+    if not urls:
+        return None
+    tokenized = [(url_expiry(u), i, u) for i, u in enumerate(urls) if url_expiry(u)]
+    if tokenized:
+        return max(tokenized)[2]
+    return urls[-1]
+
+# ---------------------------------------------------------------------------
+# Reglas MPD -> HLS
+# ---------------------------------------------------------------------------
+
+def _with_path(url: str, fn: Callable[[str], str]) -> Optional[str]:
+    """Aplica ``fn`` solo al path de ``url`` (query y token intactos)."""
+    parts = urlsplit(url)
+    path = fn(parts.path)
+    return urlunsplit(parts._replace(path=path)) if path != parts.path else None
+
+
+def _sibling(name: str) -> Callable[[str], Optional[str]]:
+    return lambda url: _with_path(url, lambda p: posixpath.join(posixpath.dirname(p), name))
+
+
+HLS_RULES: Dict[str, Callable[[str], Optional[str]]] = {
+    # cvattv y otros: ..._dash_enc/x.mpd -> ..._hls_enc/x.m3u8
+    "hls_enc": lambda url: _with_path(url, lambda p: p.replace("_dash_enc", "_hls_enc").replace(".mpd", ".m3u8")),
+    "ext": lambda url: _with_path(url, lambda p: p.replace(".mpd", ".m3u8")),
+    "dash_dir": lambda url: _with_path(url, lambda p: p.replace("/dash/", "/hls/").replace(".mpd", ".m3u8")),
+    "master": _sibling("master.m3u8"),
+    "index": _sibling("index.m3u8"),
+    "playlist": _sibling("playlist.m3u8"),
+}
+
+
+def is_playlist(url: str, headers: Optional[dict] = None) -> bool:
+    """True si ``url`` responde 200 con un cuerpo que empieza como playlist HLS."""
+    try:
+        with fetch(url, headers=headers or {}, timeout=PROBE_TIMEOUT, stream=True) as resp:
+            if resp.status_code != 200:
+                return False
+            head = next(resp.iter_content(64), b"")
+            return head.lstrip().startswith(b"#EXTM3U")
+    except Exception:
+        return False
+
+
+_MEMORY: Optional[HlsRuleMemory] = None
+
+
+def get_memory() -> HlsRuleMemory:
+    global _MEMORY
+    if _MEMORY is None:
+        _MEMORY = HlsRuleMemory(RULES_FILE)
+    return _MEMORY
+
+
+def _sources(mpd_url: str, headers: dict) -> Dict[str, str]:
+    """URLs sobre las que aplicar las reglas: ``original``, ``final`` (tras
+    redirecciones, la tokenizada) y ``base`` (``BaseURL`` del manifiesto)."""
+    sources = {"original": mpd_url}
+    try:
+        resp = fetch(mpd_url, headers=headers, timeout=PROBE_TIMEOUT)
+        if resp.status_code == 200:
+            sources["final"] = resp.url
+            mpd = parse_mpd(resp.text, resp.url)
+            if mpd["base_url"] != resp.url:
+                sources["base"] = urljoin(mpd["base_url"], posixpath.basename(urlsplit(resp.url).path))
+    except Exception:
+        pass
+    return sources
+
+
+def derive_hls_from_mpd(mpd_url: str, headers: Optional[dict] = None) -> Optional[str]:
+    """Intenta obtener la variante .m3u8 de un .mpd. Primero la regla que ya
+    funcionó para el host; si no, todas las reglas en paralelo."""
+    headers = headers or {}
+    host = urlsplit(mpd_url).netloc.lower()
+    memory = get_memory()
+    known = memory.get(host)  # (regla, fuente) o None
+
+    sources = None
+    if known and known[0] in HLS_RULES:
+        rule, kind = known
+        if kind != "original":
+            sources = _sources(mpd_url, headers)
+        source = (sources or {"original": mpd_url}).get(kind)
+        hls = HLS_RULES[rule](source) if source else None
+        if hls and is_playlist(hls, headers):
+            memory.remember(host, rule, kind)
+            memory.save()
+            return hls
+
+    candidates = []  # (regla, fuente, url)
+    seen = set()
+    for kind, source in (sources or _sources(mpd_url, headers)).items():
+        for name, rule in HLS_RULES.items():
+            hls = rule(source)
+            if hls and hls not in seen:
+                seen.add(hls)
+                candidates.append((name, kind, hls))
+
+    i, _ = first_success([lambda u=u: is_playlist(u, headers) for _, _, u in candidates],
+                         workers=len(candidates) or 1)
+    if i < 0:
+        return None
+    rule, kind, hls = candidates[i]
+    memory.remember(host, rule, kind)
+    memory.save()
+    return hls
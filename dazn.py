@@ -4,19 +4,24 @@
 # ──────────────────────────────────────────────────────────────────────────────
 """Construye un playlist M3U que incluya streams HLS (.m3u8) y DASH (.mpd)
 de canales embebidos en páginas usando requests + Selenium-Wire.
-Si captura un .mpd, intenta derivar un .m3u8 mediante sustituciones comunes.
+Si captura un .mpd, intenta derivar un .m3u8 (ver ``dash_manifest.py``).
 """
 from __future__ import annotations
-import re
-import time
+import threading
 from pathlib import Path
 from typing import Optional, List, Tuple
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 from seleniumwire import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
+
+from dash_manifest import best_mpd, derive_hls_from_mpd
+from http_pool import close_session, fetch, run_parallel
+from liveness import probe_stream
+from iframe_crawler import crawl
+from stream_cache import StreamCache
+from capture import (MANIFEST_SCOPES, configure_interception, quiet_chrome,
+                     seleniumwire_options, wait_for_manifest)
 
 # ---------------------------------------------------------------------------
 # Configuración editable
@@ -35,6 +40,12 @@ HEADERS = {
 
 SALIDA = Path(__file__).with_name("varios.m3u")
 LOGS = Path(__file__).with_name("debug_requests.log")
+# Streams capturados por página, vigentes hasta su vencimiento (ver stream_cache.py).
+# Archivo propio: canales_varios.py guarda el suyo completo y lo pisaría
+CACHE = StreamCache(Path(__file__).with_name(".dazn_cache.json"))
+# True: selenium-wire guarda todas las peticiones (debug_requests.log completo)
+LOG_ALL_REQUESTS = False
+SLOW_WAIT = 12  # segundos máximos esperando el manifiesto en Chromium
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -57,20 +68,21 @@ def extract_iframe(html: str) -> Optional[str]:
     return normalize(tag["src"]) if tag else None
 
 
-def stream_quick(iframe_url: str) -> Optional[str]:
-    """Búsqueda rápida de .m3u8 o .mpd en el HTML del iframe."""
-    try:
-        txt = requests.get(iframe_url, headers=HEADERS, timeout=10).text
-        m = re.search(r"https?://[^'\"\s]+\.(?:m3u8|mpd)[^'\"\s]*", txt)
-        return m.group(0) if m else None
-    except Exception:
+def stream_quick(page_url: str, html: Optional[str] = None) -> Optional[str]:
+    """Búsqueda rápida de .m3u8 o .mpd siguiendo por HTTP los iframes de la
+    página; solo se acepta si reproduce."""
+    hit = crawl(page_url, html=html, exts=("m3u8", "mpd"))
+    if hit and not probe_stream({"url": hit["url"], "user_agent": HEADERS["User-Agent"]})["ok"]:
+        # Player de publicidad o URL fija vencida: que decida Chromium
         return None
+    return hit["url"] if hit else None
 
 # ---------------------------------------------------------------------------
 # Selenium‑wire (headless) para captura de peticiones
 # ---------------------------------------------------------------------------
 
 _DRIVER: Optional[webdriver.Chrome] = None
+_DRIVER_LOCK = threading.Lock()
 
 
 def _chrome_options() -> Options:
@@ -80,100 +92,100 @@ def _chrome_options() -> Options:
     opts.add_argument("--no-sandbox")
     opts.add_argument("--mute-audio")
     opts.add_argument("--disable-dev-shm-usage")
+    quiet_chrome(opts)
     return opts
 
 
 def _init_driver() -> webdriver.Chrome:
     opts = _chrome_options()
-    return webdriver.Chrome(options=opts)
+    driver = webdriver.Chrome(options=opts, seleniumwire_options=seleniumwire_options())
+    configure_interception(driver, scopes=None if LOG_ALL_REQUESTS else MANIFEST_SCOPES)
+    return driver
 
 
 def stream_slow(iframe_url: str) -> Optional[str]:
-    """Carga el iframe en Chromium y espía las peticiones para capturar .m3u8 o .mpd."""
+    """Carga el iframe en Chromium y espía las peticiones para capturar .m3u8 o .mpd.
+    Hay un solo driver compartido, así que los canales pasan de a uno."""
     global _DRIVER
-    if _DRIVER is None:
-        _DRIVER = _init_driver()
-    driver = _DRIVER
+    with _DRIVER_LOCK:
+        if _DRIVER is None:
+            _DRIVER = _init_driver()
+        return _sniff_stream(_DRIVER, iframe_url)
+
+
+def _sniff_stream(driver: webdriver.Chrome, iframe_url: str) -> Optional[str]:
     try:
-        driver.requests.clear()
+        del driver.requests  # driver compartido: descartar capturas previas
         driver.get(iframe_url)
-        WebDriverWait(driver, 12).until(
-            lambda d: any(ext in r.url for r in d.requests for ext in ['.m3u8', '.mpd'])
-        )
+        wait_for_manifest(driver, SLOW_WAIT)
         LOGS.write_text("\n".join(
             f"{r.method} {r.url} -> {r.response.status_code if r.response else 'NO RESP'}"
             for r in driver.requests
         ), encoding="utf-8")
-        for r in driver.requests:
-            if any(ext in r.url for ext in ['.m3u8', '.mpd']):
-                return r.url
+        urls = [r.url for r in driver.requests]
+        for url in urls:
+            if '.m3u8' in url:
+                return url
+        # Varios .mpd del mismo player: el tokenizado vigente (ver dash_manifest.best_mpd)
+        return best_mpd([url for url in urls if '.mpd' in url])
     except Exception:
         return None
     return None
 
 
-def capture_stream(iframe_url: str) -> Optional[str]:
-    iframe_url = normalize(iframe_url)
-    url = stream_quick(iframe_url)
+def capture_stream(page_url: str, html: str) -> Optional[str]:
+    """Caché, luego crawl HTTP y solo si no alcanza, Chromium sobre el primer iframe."""
+    cached = CACHE.get(page_url)
+    if cached:
+        return cached["url"]
+    url = stream_quick(page_url, html)
+    if not url:
+        iframe = extract_iframe(html)
+        url = stream_slow(iframe) if iframe else None
     if url:
-        return url
-    return stream_slow(iframe_url)
-
-# ---------------------------------------------------------------------------
-# Conversión DASH (.mpd) a HLS (.m3u8) mediante patrones
-# ---------------------------------------------------------------------------
-
-def derive_hls_from_mpd(mpd_url: str) -> Optional[str]:
-    """Intenta construir una URL .m3u8 a partir de la .mpd cambiando rutas comunes."""
-    # patrones de reemplazo: dash_enc -> hls_enc, extension .mpd -> .m3u8
-    candidates = []
-    # 1) sustituir _dash_enc por _hls_enc
-    candidates.append(mpd_url.replace('_dash_enc', '_hls_enc').replace('.mpd', '.m3u8'))
-    # 2) simplemente reemplazar .mpd por .m3u8
-    candidates.append(mpd_url.replace('.mpd', '.m3u8'))
-    # 3) reemplazar /dash/ por /hls/
-    candidates.append(mpd_url.replace('/dash/', '/hls/').replace('.mpd', '.m3u8'))
-    for hls in candidates:
-        try:
-            resp = requests.head(hls, headers=HEADERS, timeout=5)
-            if resp.status_code == 200:
-                return hls
-        except Exception:
-            continue
-    return None
+        CACHE.put(page_url, {"url": url})
+        CACHE.save()
+    return url
 
 # ---------------------------------------------------------------------------
 # Procesar cada canal y armar EXTINF
 # ---------------------------------------------------------------------------
 
 def process_channel(name: str, page_url: str) -> Optional[str]:
-    print(f"→ {name:<16} … ", end="", flush=True)
+    """Resuelve un canal. Se ejecuta en paralelo con los demás, por eso informa
+    el resultado en una sola línea al final."""
+    def report(status: str) -> None:
+        print(f"→ {name:<16} … {status}", flush=True)
+
     try:
-        html = requests.get(page_url, headers=HEADERS, timeout=15).text
+        html = fetch(page_url, headers=HEADERS, timeout=15).text
     except Exception as exc:
-        print(f"⚠️  {type(exc).__name__}")
-        return None
-
-    iframe = extract_iframe(html)
-    if not iframe:
-        print("sin iframe")
+        report(f"⚠️  {type(exc).__name__}")
         return None
 
-    stream_url = capture_stream(iframe)
+    stream_url = capture_stream(page_url, html)
     if not stream_url:
-        print("sin stream (.m3u8/.mpd)")
+        report("sin stream (.m3u8/.mpd)")
         return None
 
     # si es DASH (.mpd), intentar derivar HLS
-    if stream_url.lower().endswith('.mpd'):
-        hls = derive_hls_from_mpd(stream_url)
+    note = ""
+    if urlparse(stream_url).path.lower().endswith('.mpd'):
+        hls = derive_hls_from_mpd(stream_url, HEADERS)
         if hls:
-            print("✔ (mpd→m3u8)", flush=True)
+            note = " (mpd→m3u8)"
             stream_url = hls
         else:
-            print("✔ (mpd, sin hls)", flush=True)
-    else:
-        print("✔", flush=True)
+            note = " (mpd, sin hls)"
+
+    # No publicar streams que no reproducen (ver liveness.py)
+    health = probe_stream({"url": stream_url, "user_agent": HEADERS["User-Agent"]})
+    if not health["ok"]:
+        CACHE.drop(page_url)
+        CACHE.save()
+        report(f"✖ sin señal ({health['error']})")
+        return None
+    report(f"✔{note} {health['throughput'] // 1024} KB/s")
 
     return (f'#EXTINF:-1 tvg-name="{name}" group-title="Varios", {name}\n{stream_url}')
 
@@ -191,15 +203,16 @@ def save_playlist(entries: List[str]) -> None:
 # ---------------------------------------------------------------------------
 
 def main() -> None:
-    entries: List[str] = []
-    for name, url in CANALES:
-        ent = process_channel(name, url)
-        if ent:
-            entries.append(ent)
+    # Páginas, cadenas de iframes y sondeos HEAD en paralelo; Chromium atiende de a uno
+    results = run_parallel([lambda n=name, u=url: process_channel(n, u) for name, url in CANALES])
+    entries: List[str] = [ent for ent in results if ent]
     if entries:
         save_playlist(entries)
     else:
         print("No se generó ninguna entrada.")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        close_session()
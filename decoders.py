@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+decoders.py – Reglas para calcular la URL del manifiesto sin abrir un navegador
+
+Muchos players no esconden el stream: lo ofuscan. Este módulo es un registro
+de decodificadores que se consulta antes de Selenium (lo usa
+``iframe_crawler.crawl`` en cada documento que visita):
+
+* ``url_rule(patrón)``  – reglas por host/ruta que derivan el manifiesto de la
+  URL del player sin descargar nada (p.ej. ``cvatt.html?get=<base64>``).
+* ``deobfuscator``      – transforman un texto en otros textos a revisar:
+  JS empaquetado ``eval(function(p,a,c,k,e,d)...)``, cadenas ``atob("...")``.
+* ``extractor``         – buscan URLs de manifiesto en un texto: URLs sueltas
+  (también escapadas en JSON) y configs de player ``{file: ..., src: ...}``.
+
+Para agregar un caso nuevo alcanza con decorar una función.
+"""
+from __future__ import annotations
+
+import base64
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urljoin, urlsplit
+
+MANIFEST_EXTS = ("m3u8", "mpd")
+DECODE_ROUNDS = 3  # capas de ofuscación anidadas a deshacer (packer dentro de atob...)
+
+CVATTV_MPD = "https://cdn.cvattv.com.ar/live/c4eds/{name}/SA_Live_dash_enc/{name}.mpd"
+
+URL_RULES: List[Tuple[re.Pattern, Callable[[str], Optional[str]]]] = []
+DEOBFUSCATORS: List[Callable[[str], List[str]]] = []
+EXTRACTORS: List[Callable[[str, str], List[str]]] = []
+
+# ---------------------------------------------------------------------------
+# Registro
+# ---------------------------------------------------------------------------
+
+def url_rule(pattern: str):
+    """Registra ``fn(url) -> manifiesto | None`` para las URLs que matchean ``pattern``."""
+    def register(fn):
+        URL_RULES.append((re.compile(pattern, re.I), fn))
+        return fn
+    return register
+
+
+def deobfuscator(fn: Callable[[str], List[str]]):
+    """Registra ``fn(texto) -> [textos decodificados]``."""
+    DEOBFUSCATORS.append(fn)
+    return fn
+
+
+def extractor(fn: Callable[[str, str], List[str]]):
+    """Registra ``fn(texto, base_url) -> [urls]``."""
+    EXTRACTORS.append(fn)
+    return fn
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def manifest_regex(exts: Sequence[str] = MANIFEST_EXTS) -> re.Pattern:
+    return re.compile(r"https?:[^'\"\s<>]+?\.(?:%s)(?:\?[^'\"\s<>]*)?" % "|".join(exts))
+
+
+def find_manifests(text: str, exts: Sequence[str] = MANIFEST_EXTS) -> List[str]:
+    """URLs de manifiesto presentes en ``text`` (incluye las escapadas ``https:\\/\\/``)."""
+    return manifest_regex(exts).findall(text.replace("\\/", "/"))
+
+
+def has_ext(url: str, exts: Sequence[str] = MANIFEST_EXTS) -> bool:
+    path = urlsplit(url).path.lower()
+    return any(path.endswith("." + ext) for ext in exts)
+
+
+def b64decode(value: str) -> Optional[str]:
+    """base64 (estándar o url-safe, con o sin padding) -> texto, o None."""
+    try:
+        raw = base64.b64decode(value + "=" * (-len(value) % 4), altchars=b"-_" if "-" in value or "_" in value else None)
+        return raw.decode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+# ---------------------------------------------------------------------------
+# Reglas por host
+# ---------------------------------------------------------------------------
+
+@url_rule(r"/cvatt\.html\?(?:.*&)?get=")
+def cvattv(url: str) -> Optional[str]:
+    """``cvatt.html?get=Q2FuYWwxMF9VUlU=`` -> canal ``Canal10_URU`` en el CDN de cvattv
+    (el CDN redirige el .mpd sin token a la URL ``tok_<JWT>``)."""
+    name = b64decode(dict(parse_qsl(urlsplit(url).query)).get("get", ""))
+    if not name or not re.fullmatch(r"[\w-]+", name):
+        return None
+    return CVATTV_MPD.format(name=name)
+
+# ---------------------------------------------------------------------------
+# Desofuscadores
+# ---------------------------------------------------------------------------
+
+PACKED_RE = re.compile(
+    r"}\s*\(\s*'((?:[^'\\]|\\.)*)'\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*'((?:[^'\\]|\\.)*)'\.split\(\s*'\|'\s*\)",
+    re.S,
+)
+PACKER_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _unbase(word: str, radix: int) -> Optional[int]:
+    if radix > len(PACKER_ALPHABET):
+        return None
+    n = 0
+    for ch in word:
+        digit = PACKER_ALPHABET.find(ch)
+        if digit < 0 or digit >= radix:
+            return None
+        n = n * radix + digit
+    return n
+
+
+@deobfuscator
+def unpack_packed(text: str) -> List[str]:
+    """Desempaqueta ``eval(function(p,a,c,k,e,d){...}('...',62,120,'a|b|...'.split('|')))``."""
+    out = []
+    for m in PACKED_RE.finditer(text):
+        payload = m.group(1).replace("\\'", "'").replace("\\\\", "\\")
+        radix = int(m.group(2))
+        words = m.group(4).split("|")
+
+        def lookup(w: re.Match) -> str:
+            n = _unbase(w.group(0), radix)
+            return words[n] if n is not None and n < len(words) and words[n] else w.group(0)
+
+        out.append(re.sub(r"\b\w+\b", lookup, payload))
+    return out
+
+
+ATOB_RE = re.compile(r"atob\(\s*['\"]([A-Za-z0-9+/=_-]{8,})['\"]\s*\)")
+
+
+@deobfuscator
+def decode_atob(text: str) -> List[str]:
+    """Contenido de las cadenas ``atob("...")``."""
+    return [s for s in (b64decode(m.group(1)) for m in ATOB_RE.finditer(text)) if s]
+
+# ---------------------------------------------------------------------------
+# Extractores
+# ---------------------------------------------------------------------------
+
+@extractor
+def plain_urls(text: str, base: str) -> List[str]:
+    """URLs absolutas de manifiesto en el texto."""
+    return find_manifests(text)
+
+
+CONFIG_RE = re.compile(
+    r"""["']?(?:file|src|source|hls|dash|url|manifest|stream)["']?\s*[:=]\s*["']([^"'\s]+?\.(?:m3u8|mpd)(?:\?[^"'\s]*)?)["']""",
+    re.I,
+)
+
+
+@extractor
+def player_config(text: str, base: str) -> List[str]:
+    """``{file: "/hls/x.m3u8"}``, ``"src":"..."`` y similares (rutas relativas incluidas)."""
+    return [urljoin(base, m.group(1).replace("\\/", "/")) for m in CONFIG_RE.finditer(text)]
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+def decode_url(url: str, exts: Sequence[str] = MANIFEST_EXTS) -> Optional[Tuple[str, str]]:
+    """Aplica las reglas por host a la URL de un player: ``(manifiesto, regla)`` o None."""
+    for pattern, rule in URL_RULES:
+        if pattern.search(url):
+            try:
+                found = rule(url)
+            except Exception:
+                continue
+            if found and has_ext(found, exts):
+                return found, rule.__name__
+    return None
+
+
+def expand(text: str, rounds: int = DECODE_ROUNDS) -> List[str]:
+    """El texto original más todas las capas que los desofuscadores logran abrir."""
+    layers, frontier = [text], [text]
+    for _ in range(rounds):
+        new = []
+        for layer in frontier:
+            for deob in DEOBFUSCATORS:
+                try:
+                    new.extend(deob(layer))
+                except Exception:
+                    continue
+        if not new:
+            break
+        layers += new
+        frontier = new
+    return layers
+
+
+def decode_text(text: str, base: str = "", exts: Sequence[str] = MANIFEST_EXTS) -> List[Tuple[str, str]]:
+    """Manifiestos hallados en ``text`` (y sus capas decodificadas), sin repetir:
+    lista de ``(url, extractor)`` en orden de aparición."""
+    seen, found = set(), []
+    for layer in expand(text):
+        for ext_fn in EXTRACTORS:
+            try:
+                urls = ext_fn(layer, base)
+            except Exception:
+                continue
+            for url in urls:
+                if url not in seen and url.startswith("http") and has_ext(url, exts):
+                    seen.add(url)
+                    found.append((url, ext_fn.__name__))
+    return found
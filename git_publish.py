@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+git_publish.py – Commit y push de los playlists solo cuando cambian de verdad
+
+Casi todas las corridas reescriben las URLs (tokens nuevos) aunque los
+partidos y streams sean los mismos, y un commit por corrida hace crecer el
+historial sin parar. Antes de publicar se compara cada playlist con el ya
+publicado (ver ``playlist_diff.py``):
+
+* sin cambios de texto: no se hace nada,
+* solo tokens/vencimientos/orden: según ``TOKEN_CHANGES`` se enmienda el
+  último commit automático y se hace force-push (``amend``, por defecto: las
+  URLs publicadas siguen vigentes sin sumar commits), se omite (``skip``) o
+  se hace un commit nuevo (``commit``),
+* cambió un partido, canal o stream: commit nuevo.
+
+Con ``PUBLISH_BRANCH`` los playlists no van a la rama actual sino a una rama
+huérfana que se reemplaza en cada publicación por un único commit sin
+padres (force-push): su historial nunca crece y la rama principal queda solo
+con código. Uso desde el workflow, después de ``pelota_builder.py``::
+
+    python git_publish.py eventos.m3u playlist.m3u
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from git import Repo, exc as git_exc
+
+from playlist_diff import diff, meaningful_change
+
+REPO_DIR = Path(__file__).parent
+PLAYLIST_FILES = ("eventos.m3u", "playlist.m3u")
+# Rama huérfana para los playlists ("" = commit en la rama actual)
+PUBLISH_BRANCH = os.environ.get("PUBLISH_BRANCH", "")
+# Qué hacer si solo cambiaron tokens: "amend", "skip" o "commit"
+TOKEN_CHANGES = os.environ.get("TOKEN_CHANGES", "amend")
+# Commits automáticos que se pueden enmendar (el segundo es el del workflow anterior)
+AUTO_PREFIXES = ("Update playlist", "AutoScraper update playlist")
+
+# ---------------------------------------------------------------------------
+# Comparación con lo publicado
+# ---------------------------------------------------------------------------
+
+def _published(repo: Repo, rev: Optional[str], name: str) -> Optional[str]:
+    if rev is None:
+        return None
+    try:
+        return repo.git.show(f"{rev}:{name}")
+    except git_exc.GitCommandError:
+        return None
+
+
+def classify(repo: Repo, rev: Optional[str], names: List[str]) -> Tuple[str, int, int]:
+    """Compara los playlists del árbol de trabajo con los de ``rev``:
+    ``("same"|"tokens"|"changed", agregadas, quitadas)``."""
+    kind, added, removed = "same", 0, 0
+    for name in names:
+        old = _published(repo, rev, name)
+        new = (Path(repo.working_tree_dir) / name).read_text(encoding="utf-8")
+        if old is not None and old.rstrip("\n") == new.rstrip("\n"):
+            continue
+        if meaningful_change(old, new):
+            kind = "changed"
+            a, r = diff(old, new)
+            added, removed = added + a, removed + r
+        elif kind == "same":
+            kind = "tokens"
+    return kind, added, removed
+
+# ---------------------------------------------------------------------------
+# Publicación
+# ---------------------------------------------------------------------------
+
+def _is_auto(commit) -> bool:
+    return commit.message.startswith(AUTO_PREFIXES)
+
+
+def _parents(repo: Repo, rev: str = "HEAD") -> List[str]:
+    return repo.git.rev_list("--parents", "-n", "1", rev).split()[1:]
+
+
+def _amend_parents(repo: Repo) -> Optional[List[str]]:
+    """Padres de HEAD si se puede enmendar sin perder historial, si no None.
+    En un clon superficial (``actions/checkout`` usa depth 1) HEAD no tiene
+    padres visibles y ``--amend`` dejaría un commit huérfano: el force-push
+    reemplazaría todo main por él. Se trae el padre antes (``--deepen``)."""
+    if not _is_auto(repo.head.commit):
+        return None
+    if repo.git.rev_parse("--is-shallow-repository") == "true":
+        try:
+            repo.git.fetch("--deepen=1", "origin")
+        except git_exc.GitCommandError:
+            return None
+    return _parents(repo) or None
+
+
+def _publish_current(repo: Repo, names: List[str], message: str, kind: str, token_changes: str) -> str:
+    repo.index.add(names)
+    parents = _amend_parents(repo) if kind == "tokens" and token_changes == "amend" else None
+    if parents:
+        head = repo.head.commit.hexsha
+        # El mensaje sigue describiendo el último cambio real
+        repo.git.commit("--amend", "--no-edit")
+        if _parents(repo) == parents:
+            # Si alguien pusheó después de nuestro último fetch, el lease lo protege
+            repo.git.push("--force-with-lease", "origin", "HEAD")
+            return "amend"
+        repo.git.reset("--soft", head)  # nunca force-push de un commit que perdió padres
+    repo.index.commit(message)
+    repo.remote("origin").push()
+    return "commit"
+
+
+def _publish_orphan(repo: Repo, names: List[str], message: str, branch: str) -> str:
+    """Un commit sin padres con solo los playlists, force-pusheado a ``branch``."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"GIT_INDEX_FILE": os.path.join(tmp, "index")}
+        for name in names:
+            blob = repo.git.hash_object("-w", name)
+            repo.git.update_index("--add", "--cacheinfo", f"100644,{blob},{name}", env=env)
+        tree = repo.git.write_tree(env=env)
+    commit = repo.git.commit_tree(tree, "-m", message)
+    repo.git.push("--force", "origin", f"{commit}:refs/heads/{branch}")
+    return "orphan"
+
+
+def publish(files, message: str = "Update playlist", branch: str = PUBLISH_BRANCH,
+            token_changes: str = TOKEN_CHANGES, repo_dir: Path = REPO_DIR) -> str:
+    """Commit y push de ``files`` si cambiaron (ver arriba). Devuelve lo que
+    hizo: ``"none"``, ``"skip"``, ``"amend"``, ``"commit"`` u ``"orphan"``."""
+    repo = Repo(repo_dir)
+    names = [os.path.relpath(Path(f).resolve(), Path(repo.working_tree_dir).resolve()) for f in files]
+
+    rev = "HEAD"
+    if branch:
+        try:
+            repo.git.fetch("--depth=1", "origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}")
+            rev = f"origin/{branch}"
+        except git_exc.GitCommandError:
+            rev = None  # la rama todavía no existe
+
+    kind, added, removed = classify(repo, rev, names)
+    if kind == "same":
+        print("Playlists sin cambios: no se publica.")
+        return "none"
+    if kind == "tokens" and token_changes == "skip":
+        print("Solo cambiaron tokens: no se publica.")
+        return "skip"
+    message += f" (+{added} -{removed})" if kind == "changed" else " (solo tokens)"
+
+    if branch:
+        action = _publish_orphan(repo, names, message, branch)
+    else:
+        action = _publish_current(repo, names, message, kind, token_changes)
+    print(f"Publicado ({action}): {message}")
+    return action
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Commit y push de playlists solo si cambiaron")
+    parser.add_argument("files", nargs="*", default=list(PLAYLIST_FILES))
+    parser.add_argument("--message", default="Update playlist")
+    parser.add_argument("--branch", default=PUBLISH_BRANCH, help="rama huérfana para los playlists")
+    parser.add_argument("--token-changes", default=TOKEN_CHANGES, choices=("amend", "skip", "commit"))
+    args = parser.parse_args()
+    publish([REPO_DIR / f for f in args.files], args.message, args.branch, args.token_changes)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+hls_playlist.py – Lectura de playlists HLS (.m3u8): master vs media y variantes
+
+El manifiesto capturado en Chrome puede ser el master (lista de calidades),
+una variante concreta o un chunklist de segmentos que vence en segundos.
+``fetch_playlist`` lo descarga en streaming con las mismas cabeceras que usó
+el player y lo clasifica; de un master extrae las variantes (``BANDWIDTH``,
+``RESOLUTION``, ``CODECS``...) y de un media playlist solo lee los primeros
+segmentos (no hace falta bajarlo entero).
+
+``attach_variants`` agrega esa información al dict de stream y
+``renditions`` decide qué escribir en el playlist según el modo:
+
+* ``master``   – la URL capturada tal cual (el cliente elige la calidad),
+* ``best``     – la variante de mayor bitrate,
+* ``lowest``   – la más liviana,
+* ``variants`` – una entrada por variante, etiquetadas (``720p``...).
+"""
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from http_pool import fetch
+
+PROBE_TIMEOUT = 8       # segundos para descargar un playlist
+MAX_SEGMENTS = 3        # segmentos leídos de un media playlist antes de cortar
+MAX_LINES = 5000        # tope de líneas leídas por playlist
+MODES = ("master", "best", "lowest", "variants")
+
+ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+# ---------------------------------------------------------------------------
+# Parser
+# ---------------------------------------------------------------------------
+
+def parse_attributes(text: str) -> dict:
+    """``BANDWIDTH=1280000,CODECS="avc1.4d401f,mp4a.40.2"`` -> dict (sin comillas)."""
+    return {k: v.strip('"') for k, v in ATTR_RE.findall(text)}
+
+
+def _variant(attrs: dict, uri: str, base: str) -> dict:
+    resolution = attrs.get("RESOLUTION", "")
+    height = resolution.partition("x")[2]
+    return {
+        "url": urljoin(base, uri),
+        "bandwidth": int(attrs.get("BANDWIDTH", 0) or 0),
+        "average_bandwidth": int(attrs.get("AVERAGE-BANDWIDTH", 0) or 0),
+        "resolution": resolution,
+        "height": int(height) if height.isdigit() else 0,
+        "codecs": attrs.get("CODECS", ""),
+        "frame_rate": attrs.get("FRAME-RATE", ""),
+    }
+
+
+def parse_lines(lines: Iterable[str], url: str, max_segments: Optional[int] = MAX_SEGMENTS) -> Optional[dict]:
+    """Lee un playlist línea a línea. Devuelve ``{"kind": "master"|"media",
+    "variants", "media", "segments", "target_duration", "media_sequence",
+    "endlist"}`` o None si no es un playlist HLS. En un media playlist deja de
+    leer tras ``max_segments`` segmentos."""
+    lines = iter(lines)
+    first = ""
+    for first in lines:
+        first = first.strip().lstrip("\ufeff")
+        if first:
+            break
+    if first != "#EXTM3U":
+        return None
+
+    playlist = {"kind": "media", "variants": [], "media": [], "segments": [],
+                "target_duration": None, "media_sequence": 0, "endlist": False}
+    pending = None  # atributos del último #EXT-X-STREAM-INF
+    for n, line in enumerate(lines):
+        if n >= MAX_LINES:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            playlist["kind"] = "master"
+            pending = parse_attributes(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-MEDIA:"):
+            playlist["kind"] = "master"
+            attrs = parse_attributes(line.split(":", 1)[1])
+            if "URI" in attrs:
+                attrs["URI"] = urljoin(url, attrs["URI"])
+            playlist["media"].append(attrs)
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            playlist["target_duration"] = float(line.split(":", 1)[1] or 0)
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            playlist["media_sequence"] = int(line.split(":", 1)[1] or 0)
+        elif line.startswith("#EXT-X-ENDLIST"):
+            playlist["endlist"] = True
+        elif line.startswith("#"):
+            continue
+        elif pending is not None:
+            playlist["variants"].append(_variant(pending, line, url))
+            pending = None
+        else:
+            playlist["segments"].append(urljoin(url, line))
+            if max_segments is not None and len(playlist["segments"]) >= max_segments:
+                break
+    return playlist
+
+
+def parse_playlist(text: str, url: str, max_segments: Optional[int] = None) -> Optional[dict]:
+    return parse_lines(text.splitlines(), url, max_segments)
+
+
+def fetch_playlist(url: str, headers: Optional[dict] = None,
+                   max_segments: Optional[int] = MAX_SEGMENTS) -> Optional[dict]:
+    """Descarga (en streaming) y parsea el playlist; None si falla o no es HLS.
+    ``"url"`` queda con la URL final, tras redirecciones."""
+    try:
+        with fetch(url, headers=headers or {}, timeout=PROBE_TIMEOUT, stream=True) as resp:
+            if resp.status_code != 200:
+                return None
+            lines = resp.iter_lines(decode_unicode=True)
+            if resp.encoding is None:
+                lines = (l.decode("utf-8", "replace") if isinstance(l, bytes) else l for l in lines)
+            playlist = parse_lines(lines, resp.url, max_segments)
+    except Exception:
+        return None
+    if playlist is not None:
+        playlist["url"] = resp.url
+    return playlist
+
+# ---------------------------------------------------------------------------
+# Streams y renditions
+# ---------------------------------------------------------------------------
+
+def stream_headers(stream: dict) -> dict:
+    """Cabeceras HTTP a partir de un dict de stream (``referer``, ``user_agent``...)."""
+    pairs = (("Referer", "referer"), ("User-Agent", "user_agent"),
+             ("Origin", "origin"), ("Cookie", "cookie"))
+    return {header: stream[key] for header, key in pairs if stream.get(key)}
+
+
+def attach_variants(stream: dict, playlist: Optional[dict] = None) -> dict:
+    """Agrega ``"kind"`` y ``"variants"`` (de mayor a menor bitrate) al stream.
+    Si ``playlist`` no viene, lo descarga con las cabeceras del stream."""
+    if ".m3u8" not in stream.get("url", ""):
+        return stream
+    if playlist is None:
+        playlist = fetch_playlist(stream["url"], stream_headers(stream))
+    if playlist is None:
+        return stream
+    stream = dict(stream, kind=playlist["kind"])
+    if playlist["variants"]:
+        stream["variants"] = sorted(playlist["variants"], key=lambda v: v["bandwidth"], reverse=True)
+    return stream
+
+
+def variant_label(variant: dict) -> str:
+    if variant.get("height"):
+        return f"{variant['height']}p"
+    if variant.get("bandwidth"):
+        return f"{variant['bandwidth'] // 1000} kbps"
+    return ""
+
+
+def renditions(stream: dict, mode: str = "master") -> List[Tuple[str, dict]]:
+    """Entradas a escribir para ``stream``: lista de ``(etiqueta, stream)``.
+    Sin variantes conocidas (o modo ``master``) es el stream tal cual."""
+    variants = stream.get("variants") or []
+    if mode == "master" or not variants:
+        return [("", stream)]
+    base = {k: v for k, v in stream.items() if k != "variants"}
+
+    def pick(v: dict) -> Tuple[str, dict]:
+        return variant_label(v), dict(base, url=v["url"], kind="media", bandwidth=v["bandwidth"],
+                                      resolution=v["resolution"], codecs=v["codecs"])
+
+    if mode == "variants":
+        return [pick(v) for v in variants]
+    return [pick(variants[-1] if mode == "lowest" else variants[0])]
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+hls_relay.py – Relay HLS/DASH que inyecta las cabeceras capturadas y comparte segmentos
+
+Muchos reproductores ignoran las líneas ``#EXTVLCOPT:http-referrer/...`` y
+piden el stream sin Referer, User-Agent, Origin ni Cookie, y el CDN lo
+rechaza. El relay se pone en el medio:
+
+* cada stream se registra con un id (``register``) junto a las cabeceras con
+  las que se capturó (ver ``hls_playlist.stream_headers``),
+* los playlists se piden al origen con esas cabeceras y se reescriben para
+  que toda URI (variantes, segmentos, ``URI="..."`` de ``EXT-X-KEY``,
+  ``EXT-X-MAP``, ``EXT-X-MEDIA``) vuelva a pasar por el relay; en un .mpd se
+  reescriben las ``BaseURL`` (y se agrega una raíz si no hay), así los
+  ``SegmentTemplate`` relativos también se resuelven contra el relay,
+* los segmentos se guardan en un LRU en memoria acotado por bytes
+  (``SegmentCache``): N espectadores del mismo partido hacen una sola
+  descarga por segmento, y si lo piden a la vez esperan la misma
+  (``Coalescer``). Los playlists en vivo se comparten ``MANIFEST_TTL``.
+
+Las rutas son ``/relay/<id>/index.m3u8`` o ``index.mpd`` (el stream
+registrado), ``/relay/<id>/<url en base64>.<ext>`` y, para DASH,
+``/relay/<id>/base/<directorio en base64>/<ruta relativa>``. Solo se siguen URLs de hosts que
+aparecieron en playlists de ese stream, para no ser un proxy abierto.
+``playlist_server.py --relay`` redirige ``/play/<id>`` al relay; también
+corre solo, para un stream suelto::
+
+    python hls_relay.py https://cdn.example/live/master.m3u8 --referer https://player.example/
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import binascii
+import html
+import posixpath
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from hls_playlist import stream_headers
+from http_pool import HEADERS, Coalescer, close_session, fetch
+
+HOST = "127.0.0.1"
+PORT = 8766
+PREFIX = "/relay/"
+CACHE_BYTES = 256 * 1024 * 1024  # tope del LRU de segmentos
+SEGMENT_MAX = 32 * 1024 * 1024   # segmentos más grandes no se guardan
+MANIFEST_TTL = 1.0               # segundos que un playlist en vivo se comparte entre espectadores
+UPSTREAM_TIMEOUT = 15
+
+URI_ATTR_RE = re.compile(r'URI="([^"]+)"')
+BASE_URL_RE = re.compile(r"(<BaseURL[^>]*>)\s*([^<]+?)\s*(</BaseURL>)")
+MPD_OPEN_RE = re.compile(r"<MPD\b[^>]*>")
+BASE_DIR = "base"  # /relay/<id>/base/<directorio en base64>/<ruta relativa>
+EXT_RE = re.compile(r"\.([A-Za-z0-9]{1,5})$")
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+# ---------------------------------------------------------------------------
+# URLs del relay
+# ---------------------------------------------------------------------------
+
+def _token(url: str) -> str:
+    return base64.urlsafe_b64encode(url.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def encode_target(url: str) -> str:
+    """URL de origen -> nombre de recurso del relay, con la extensión original
+    (``.m3u8``, ``.ts``...) para los reproductores que la miran."""
+    token = _token(url)
+    ext = EXT_RE.search(posixpath.basename(urlsplit(url).path))
+    return f"{token}.{ext.group(1).lower()}" if ext else token
+
+
+def decode_target(name: str) -> Optional[str]:
+    token = name.split(".", 1)[0]
+    try:
+        return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def encode_base(url: str) -> str:
+    """URL de origen -> ``base/<directorio en base64>/<archivo>``: lo que el
+    reproductor resuelva relativo a esto sigue pasando por el relay."""
+    directory, _, filename = url.rpartition("/")
+    return f"{BASE_DIR}/{_token(directory + '/')}/{filename}"
+
+
+def is_playlist_response(content_type: str, body: bytes) -> bool:
+    return "mpegurl" in content_type.lower() or body[:64].lstrip(b"\xef\xbb\xbf \r\n").startswith(b"#EXTM3U")
+
+
+def is_mpd_response(content_type: str, body: bytes) -> bool:
+    return "dash+xml" in content_type.lower() or b"<MPD" in body[:2048]
+
+
+def rewrite_playlist(text: str, base: str, to_local: Callable[[str], str]) -> str:
+    """Reescribe cada URI de un playlist HLS (líneas de recurso y ``URI="..."``)
+    con ``to_local(url_absoluta)``. Esquemas que no son http(s) quedan igual."""
+    def local(uri: str) -> str:
+        url = urljoin(base, uri)
+        return to_local(url) if urlsplit(url).scheme in ("http", "https") else uri
+
+    out = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            out.append(line)
+        elif stripped.startswith("#"):
+            out.append(URI_ATTR_RE.sub(lambda m: f'URI="{local(m.group(1))}"', line))
+        else:
+            out.append(local(stripped))
+    return "\n".join(out) + "\n"
+
+
+def rewrite_mpd(text: str, base: str, to_local: Callable[[str], str]) -> str:
+    """Reescribe las ``BaseURL`` de un .mpd con ``to_local(url_absoluta)``. Las
+    del nivel raíz (antes del primer ``<Period``) se resuelven contra ``base``;
+    más adentro solo las absolutas, las relativas ya cuelgan de la raíz. Si no
+    hay ``BaseURL`` raíz se agrega una con el directorio del manifiesto."""
+    cut = text.find("<Period")
+    head, rest = (text, "") if cut < 0 else (text[:cut], text[cut:])
+    has_root = bool(BASE_URL_RE.search(head))
+
+    def root(m: re.Match) -> str:
+        return m.group(1) + to_local(urljoin(base, html.unescape(m.group(2)))) + m.group(3)
+
+    def nested(m: re.Match) -> str:
+        url = html.unescape(m.group(2))
+        if urlsplit(url).scheme not in ("http", "https"):
+            return m.group(0)
+        return m.group(1) + to_local(url) + m.group(3)
+
+    head = BASE_URL_RE.sub(root, head)
+    rest = BASE_URL_RE.sub(nested, rest)
+    if not has_root:
+        head = MPD_OPEN_RE.sub(lambda m: f"{m.group(0)}<BaseURL>{to_local(urljoin(base, './'))}</BaseURL>",
+                               head, count=1)
+    return head + rest
+
+# ---------------------------------------------------------------------------
+# Caché de segmentos
+# ---------------------------------------------------------------------------
+
+class SegmentCache:
+    """LRU de ``url -> (content_type, datos)`` acotado por ``max_bytes``."""
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            item = self._items.get(url)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(url)
+            self.hits += 1
+            return item
+
+    def put(self, url: str, content_type: str, data: bytes) -> None:
+        if len(data) > min(SEGMENT_MAX, self.max_bytes):
+            return
+        with self._lock:
+            old = self._items.pop(url, None)
+            if old:
+                self.size -= len(old[1])
+            self._items[url] = (content_type, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+# ---------------------------------------------------------------------------
+# Relay
+# ---------------------------------------------------------------------------
+
+class Relay:
+    """Streams registrados por id y descarga compartida de sus recursos.
+    ``respond(path)`` devuelve ``(status, cabeceras, cuerpo)`` para una ruta
+    bajo ``PREFIX``; el servidor HTTP que lo monte solo tiene que enviarlo."""
+
+    def __init__(self, cache_bytes: int = CACHE_BYTES, manifest_ttl: float = MANIFEST_TTL):
+        self.segments = SegmentCache(cache_bytes)
+        self.manifest_ttl = manifest_ttl
+        self.upstream = 0  # descargas al origen
+        self._lock = threading.Lock()
+        self._streams: Dict[str, dict] = {}  # id -> {"url", "headers", "hosts"}
+        self._manifests: Dict[Tuple[str, str], Tuple[float, Response]] = {}
+        self._coalescer = Coalescer()
+
+    def register(self, sid: str, stream: dict) -> str:
+        """Registra (o actualiza, si se re-resolvió) ``stream`` bajo ``sid``.
+        Devuelve la ruta local de su playlist."""
+        with self._lock:
+            known = self._streams.get(sid)
+            hosts = set(known["hosts"]) if known else set()
+            hosts.add(urlsplit(stream["url"]).netloc)
+            self._streams[sid] = {"url": stream["url"], "headers": stream_headers(stream), "hosts": hosts}
+        ext = "mpd" if urlsplit(stream["url"]).path.lower().endswith(".mpd") else "m3u8"
+        return f"{PREFIX}{sid}/index.{ext}"
+
+    def _allow(self, sid: str, url: str) -> None:
+        with self._lock:
+            self._streams[sid]["hosts"].add(urlsplit(url).netloc)
+
+    def _fetch(self, url: str, headers: dict) -> Tuple[int, str, str, bytes]:
+        """``(status, url_final, content_type, datos)`` del origen."""
+        with self._lock:
+            self.upstream += 1
+        resp = fetch(url, headers=headers, timeout=UPSTREAM_TIMEOUT)
+        return resp.status_code, resp.url, resp.headers.get("Content-Type", ""), resp.content
+
+    def _manifest(self, sid: str, final: str, body: bytes) -> Response:
+        text = body.decode("utf-8", "replace")
+
+        def to_local(target: str) -> str:
+            self._allow(sid, target)
+            return f"{PREFIX}{sid}/{encode_target(target)}"
+
+        body = rewrite_playlist(text, final, to_local).encode("utf-8")
+        return 200, {"Content-Type": "application/vnd.apple.mpegurl", "Cache-Control": "no-store"}, body
+
+    def _mpd(self, sid: str, final: str, body: bytes) -> Response:
+        text = body.decode("utf-8", "replace")
+
+        def to_local(target: str) -> str:
+            self._allow(sid, target)
+            return f"{PREFIX}{sid}/{encode_base(target)}"
+
+        body = rewrite_mpd(text, final, to_local).encode("utf-8")
+        return 200, {"Content-Type": "application/dash+xml", "Cache-Control": "no-store"}, body
+
+    def _resource(self, sid: str, url: str, cached: bool = True) -> Response:
+        """Descarga ``url`` con las cabeceras de ``sid``; un playlist vuelve
+        reescrito y un segmento pasa por ``SegmentCache`` (si ``cached``)."""
+        hit = self.segments.get(url) if cached else None
+        if hit:
+            return 200, {"Content-Type": hit[0]}, hit[1]
+        status, final, content_type, body = self._fetch(url, self._streams[sid]["headers"])
+        if status != 200:
+            return (status if 400 <= status < 500 else 502), {}, b""
+        if is_playlist_response(content_type, body):
+            return self._manifest(sid, final, body)
+        if is_mpd_response(content_type, body):
+            return self._mpd(sid, final, body)
+        content_type = content_type or "application/octet-stream"
+        if cached:
+            self.segments.put(url, content_type, body)
+        return 200, {"Content-Type": content_type}, body
+
+    def _shared_manifest(self, sid: str, url: str) -> Response:
+        """Playlists (que en vivo cambian cada pocos segundos): una descarga
+        cada ``manifest_ttl`` para todos los espectadores."""
+        key = (sid, url)
+        with self._lock:
+            hit = self._manifests.get(key)
+        if hit and time.monotonic() - hit[0] < self.manifest_ttl:
+            return hit[1]
+        response = self._coalescer.run(f"m:{sid}:{url}", lambda: self._resource(sid, url, cached=False))
+        if response[0] == 200:
+            with self._lock:
+                self._manifests[key] = (time.monotonic(), response)
+                # Solo quedan los playlists vigentes
+                now = time.monotonic()
+                for k in [k for k, (t, _) in self._manifests.items() if now - t >= self.manifest_ttl]:
+                    del self._manifests[k]
+        return response
+
+    def _target(self, stream: dict, name: str, query: str) -> Optional[str]:
+        if name.startswith("index."):
+            return stream["url"]
+        if name.startswith(BASE_DIR + "/"):
+            _, token, rest = (name.split("/", 2) + [""])[:3]
+            directory = decode_target(token)
+            if not directory:
+                return None
+            return urljoin(directory, rest) + (f"?{query}" if query else "")
+        return decode_target(name)
+
+    def respond(self, path: str) -> Response:
+        """``path`` es la ruta pedida, con query (DASH arma URLs relativas que la traen)."""
+        parts = urlsplit(path)
+        sid, _, name = parts.path[len(PREFIX):].partition("/")
+        with self._lock:
+            stream = self._streams.get(sid)
+        if stream is None or not name:
+            return 404, {}, b""
+        url = self._target(stream, name, parts.query)
+        if not url or urlsplit(url).netloc not in stream["hosts"]:
+            return 403, {}, b""
+        try:
+            if name.endswith((".m3u8", ".mpd")):
+                return self._shared_manifest(sid, url)
+            return self._coalescer.run(url, lambda: self._resource(sid, url))
+        except Exception as e:
+            print(f"  relay {sid}: {type(e).__name__}: {e}")
+            return 502, {}, b""
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+def send_response(handler: BaseHTTPRequestHandler, response: Response) -> None:
+    """Envía lo que devolvió ``Relay.respond`` por ``handler``."""
+    status, headers, body = response
+    handler.send_response(status)
+    headers = dict({"Content-Type": "text/plain"}, **headers)
+    headers["Content-Length"] = str(len(body))
+    headers["Access-Control-Allow-Origin"] = "*"  # reproductores web
+    for name, value in headers.items():
+        handler.send_header(name, value)
+    handler.end_headers()
+    if handler.command != "HEAD":
+        handler.wfile.write(body)
+
+
+class RelayHandler(BaseHTTPRequestHandler):
+    server_version = "pelota-relay/1.0"
+
+    def do_GET(self) -> None:
+        if not self.path.startswith(PREFIX):
+            return send_response(self, (404, {}, b""))
+        send_response(self, self.server.relay.respond(self.path))
+
+    do_HEAD = do_GET
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass  # un pedido por segmento: demasiado ruido
+
+
+class RelayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, relay: Optional[Relay] = None):
+        super().__init__(address, RelayHandler)
+        self.relay = relay or Relay()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relay HLS/DASH con cabeceras inyectadas")
+    parser.add_argument("url", help="playlist .m3u8 o manifiesto .mpd a retransmitir")
+    parser.add_argument("--referer")
+    parser.add_argument("--origin")
+    parser.add_argument("--cookie")
+    parser.add_argument("--user-agent", default=HEADERS["User-Agent"])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    server = RelayServer((args.host, args.port))
+    path = server.relay.register("stream", {"url": args.url, "referer": args.referer, "origin": args.origin,
+                                            "cookie": args.cookie, "user_agent": args.user_agent})
+    print(f"Relay en http://{args.host}:{args.port}{path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Interrumpido.")
+    finally:
+        server.server_close()
+        close_session()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+http_pool.py – Capa HTTP compartida: sesión con pools por host y fetch en paralelo
+
+Todas las descargas "baratas" (páginas fuente, iframes, HEAD de prueba) pasan
+por una única ``requests.Session`` con conexiones keep-alive reutilizables
+(urllib3 mantiene un pool por host), y se lanzan en paralelo con un pool de
+hilos acotado. Así el descubrimiento de fuentes tarda lo que la más lenta, no
+la suma de todas.
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/135 Safari/537.36"
+    )
+}
+TIMEOUT = 10        # segundos por petición
+HOST_POOLS = 32     # hosts distintos con pool propio
+POOL_MAXSIZE = 16   # conexiones vivas por host
+WORKERS = 8         # descargas simultáneas en run_parallel
+
+T = TypeVar("T")
+
+_SESSION: Optional[requests.Session] = None
+_LOCK = threading.Lock()
+
+# ---------------------------------------------------------------------------
+# Sesión
+# ---------------------------------------------------------------------------
+
+def get_session() -> requests.Session:
+    """Sesión compartida por todo el proceso (se crea al primer uso)."""
+    global _SESSION
+    with _LOCK:
+        if _SESSION is None:
+            retry = Retry(total=1, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                          allowed_methods=("GET", "HEAD"))
+            adapter = HTTPAdapter(pool_connections=HOST_POOLS, pool_maxsize=POOL_MAXSIZE,
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+            _SESSION = session
+        return _SESSION
+
+
+def close_session() -> None:
+    global _SESSION
+    with _LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+            _SESSION = None
+
+
+def fetch(url: str, method: str = "GET", timeout: float = TIMEOUT, **kwargs) -> requests.Response:
+    """``session.request`` con timeout por defecto."""
+    return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def fetch_text(url: str, **kwargs) -> Optional[str]:
+    """Cuerpo de ``url`` como texto, o None si falla."""
+    try:
+        return fetch(url, **kwargs).text
+    except Exception:
+        return None
+
+# ---------------------------------------------------------------------------
+# Paralelismo
+# ---------------------------------------------------------------------------
+
+def run_parallel(calls: List[Callable[[], T]], workers: int = WORKERS) -> List[Optional[T]]:
+    """Ejecuta las funciones sin argumentos de ``calls`` en paralelo y devuelve
+    sus resultados en el mismo orden. Una excepción se informa y da None."""
+    if not calls:
+        return []
+
+    def guarded(call):
+        try:
+            return call()
+        except Exception as e:
+            print(f"Warning: {getattr(call, '__name__', 'tarea')} falló: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(calls)))) as executor:
+        return list(executor.map(guarded, calls))
+
+
+def first_success(calls: List[Callable[[], T]], workers: int = WORKERS) -> Tuple[int, Optional[T]]:
+    """Lanza ``calls`` en paralelo y devuelve ``(índice, resultado)`` del primero
+    que termine con un resultado verdadero, sin esperar al resto (las que no
+    arrancaron se cancelan). ``(-1, None)`` si ninguna lo logra."""
+    if not calls:
+        return -1, None
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(calls))))
+    try:
+        pending = {executor.submit(call): i for i, call in enumerate(calls)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    continue
+                if result:
+                    return i, result
+        return -1, None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_all(urls: List[str], workers: int = WORKERS, **kwargs) -> List[Optional[str]]:
+    """Descarga todas las ``urls`` en paralelo (texto o None por URL)."""
+    return run_parallel([lambda u=u: fetch_text(u, **kwargs) for u in urls], workers)
+
+
+class Coalescer:
+    """Un solo cálculo en vuelo por clave: el primero que llega ejecuta ``fn``
+    y los que llegan mientras tanto esperan el mismo resultado (o excepción)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def run(self, key: str, fn: Callable[[], object]):
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+        if not leader:
+            return fut.result()
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return fut.result()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+iframe_crawler.py – Búsqueda de manifiestos siguiendo iframes por HTTP, sin navegador
+
+Muchas cadenas de players son 2–3 iframes estáticos anidados: la página del
+canal incrusta un iframe, que incrusta otro, que trae la URL del .m3u8 en el
+HTML o en un script. El crawler recorre esa cadena en anchura:
+
+* sigue ``<iframe>``, ``<frame>``, ``<embed>`` y ``<script src>`` (los scripts
+  se revisan pero no se siguen),
+* descarga cada nivel en paralelo mandando como ``Referer`` la página que lo
+  incrusta (muchos embeds lo exigen),
+* antes de descargar un documento prueba las reglas por host de
+  ``decoders.py``, y en cada documento descargado busca manifiestos con sus
+  desofuscadores/extractores (URLs sueltas, JS empaquetado, ``atob``, configs),
+* corta en ``max_depth`` niveles / ``max_docs`` documentos.
+
+Solo si no encuentra nada conviene escalar a Chromium.
+"""
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+from decoders import MANIFEST_EXTS, decode_text, decode_url
+from http_pool import fetch, run_parallel
+
+MAX_DEPTH = 3    # niveles de iframes a seguir desde la página inicial
+MAX_DOCS = 24    # documentos descargados como máximo por crawl
+
+# Librerías de players/analytics: nunca traen la URL del stream
+SKIP_HOSTS = (
+    "jwpcdn.com", "googleapis.com", "gstatic.com", "google.com", "googletagmanager.com",
+    "google-analytics.com", "cloudflareinsights.com", "cdnjs.cloudflare.com",
+    "jsdelivr.net", "jquery.com", "blogger.com", "facebook.net", "doubleclick.net",
+)
+
+CHILD_TAGS = (("iframe", "src"), ("frame", "src"), ("embed", "src"), ("script", "src"))
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _normalize(src: str, base: str) -> str:
+    src = src.strip()
+    if src.startswith("//"):
+        return "https:" + src
+    return urljoin(base, src)
+
+
+def child_links(html: str, base: str) -> List[Tuple[str, bool]]:
+    """Documentos incrustados en ``html``: lista de ``(url, es_script)``."""
+    soup = BeautifulSoup(html, "html.parser")
+    found = []
+    for tag, attr in CHILD_TAGS:
+        for el in soup.find_all(tag, **{attr: True}):
+            url = _normalize(el[attr], base)
+            if not url.startswith("http"):
+                continue
+            host = urlparse(url).netloc.lower()
+            if any(host == h or host.endswith("." + h) for h in SKIP_HOSTS):
+                continue
+            found.append((url, tag == "script"))
+    return found
+
+
+def _get(url: str, referer: Optional[str]) -> Optional[str]:
+    headers = {"Referer": referer} if referer else {}
+    try:
+        resp = fetch(url, headers=headers)
+        return resp.text if resp.status_code < 400 else None
+    except Exception:
+        return None
+
+# ---------------------------------------------------------------------------
+# Crawl
+# ---------------------------------------------------------------------------
+
+def crawl(start_url: str, html: Optional[str] = None, referer: Optional[str] = None,
+          exts: Sequence[str] = MANIFEST_EXTS, max_depth: int = MAX_DEPTH,
+          max_docs: int = MAX_DOCS) -> Optional[dict]:
+    """Recorre en anchura la cadena de iframes de ``start_url`` (``html`` evita
+    volver a descargarla) y devuelve el primer manifiesto encontrado como
+    ``{"url", "referer", "depth", "via"}``; ``referer`` es el documento que lo
+    contenía y ``via`` la regla/extractor que lo encontró. None si no aparece ninguno."""
+    seen = {start_url}
+    level = [(start_url, referer, html, False)]  # (url, referer, html, es_script)
+    docs = 0
+    for depth in range(max_depth + 1):
+        # Reglas por host: el manifiesto sale de la URL del player, sin descargarlo
+        for url, _, _, is_script in level:
+            decoded = None if is_script else decode_url(url, exts)
+            if decoded:
+                return {"url": decoded[0], "referer": url, "depth": depth, "via": decoded[1]}
+
+        missing = [i for i, item in enumerate(level) if item[2] is None]
+        texts = run_parallel([lambda u=level[i][0], r=level[i][1]: _get(u, r) for i in missing])
+        for i, text in zip(missing, texts):
+            url, ref, _, is_script = level[i]
+            level[i] = (url, ref, text, is_script)
+        docs += len(missing)
+
+        next_level = []
+        for url, ref, text, is_script in level:
+            if not text:
+                continue
+            hits = decode_text(text, ref if is_script else url, exts)
+            if hits:
+                # un script corre en el documento que lo incluye: ese es el Referer
+                return {"url": hits[0][0], "referer": ref if is_script else url,
+                        "depth": depth, "via": hits[0][1]}
+            if is_script or depth == max_depth:
+                continue
+            for child, child_is_script in child_links(text, url):
+                if child in seen or docs + len(next_level) >= max_docs:
+                    continue
+                seen.add(child)
+                next_level.append((child, url, None, child_is_script))
+        if not next_level:
+            break
+        level = next_level
+    return None
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+liveness.py – Verificación de que un stream realmente reproduce antes de publicarlo
+
+Un manifiesto capturado puede estar muerto un rato después (token vencido,
+origen caído, geobloqueo). ``probe_stream`` hace lo mismo que haría un
+reproductor, con las cabeceras capturadas (Referer, User-Agent, Origin,
+Cookie):
+
+1. descarga el manifiesto (.m3u8 o .mpd) y mide el tiempo al primer byte,
+2. si es un master HLS baja la variante más liviana,
+3. descarga el comienzo de un segmento de medios (el más nuevo si es en vivo)
+   y mide el throughput.
+
+El resultado (``health``) queda guardado en el dict del stream, así los
+espejos de un mismo partido se pueden ordenar por rendimiento real
+(``rank_key``).
+"""
+from __future__ import annotations
+
+import time
+from typing import List, Optional, Tuple
+
+from dash_manifest import parse_mpd, representations, segment_urls
+from hls_playlist import parse_playlist, stream_headers
+from http_pool import fetch, run_parallel
+
+PROBE_TIMEOUT = 8                # segundos por petición
+MANIFEST_BYTES = 1024 * 1024     # tope al leer un manifiesto
+SEGMENT_BYTES = 256 * 1024       # bytes del segmento que alcanzan para medir
+WORKERS = 8                      # streams verificados a la vez
+
+# ---------------------------------------------------------------------------
+# Descargas medidas
+# ---------------------------------------------------------------------------
+
+def _download(url: str, headers: dict, limit: int) -> Tuple[int, str, bytes, float, float]:
+    """GET en streaming hasta ``limit`` bytes: ``(status, url_final, datos, ttfb, total)``."""
+    t0 = time.monotonic()
+    with fetch(url, headers=headers, timeout=PROBE_TIMEOUT, stream=True) as resp:
+        ttfb = None
+        chunks, size = [], 0
+        for chunk in resp.iter_content(16 * 1024):
+            if ttfb is None:
+                ttfb = time.monotonic() - t0
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= limit:
+                break
+        total = time.monotonic() - t0
+        return resp.status_code, resp.url, b"".join(chunks)[:limit], ttfb or total, total
+
+
+def _health(ok: bool, error: str = "", **metrics) -> dict:
+    metrics = {k: round(v, 3) if isinstance(v, float) else v for k, v in metrics.items()}
+    return dict({"ok": ok, "error": error, "checked": time.time()}, **metrics)
+
+# ---------------------------------------------------------------------------
+# Segmentos
+# ---------------------------------------------------------------------------
+
+def _hls_segment(text: str, url: str, headers: dict) -> Optional[str]:
+    playlist = parse_playlist(text, url)
+    if playlist is None:
+        return None
+    if playlist["kind"] == "master":
+        if not playlist["variants"]:
+            return None
+        lightest = min(playlist["variants"], key=lambda v: v["bandwidth"])
+        status, final, data, _, _ = _download(lightest["url"], headers, MANIFEST_BYTES)
+        if status != 200:
+            return None
+        playlist = parse_playlist(data.decode("utf-8", "replace"), final)
+        if playlist is None:
+            return None
+    segments = playlist["segments"]
+    if not segments:
+        return None
+    # En vivo los primeros segmentos listados pueden haber salido ya del CDN
+    return segments[0] if playlist["endlist"] else segments[-1]
+
+
+def _dash_segment(text: str, url: str) -> Optional[str]:
+    mpd = parse_mpd(text, url)
+    reps = representations(mpd, "video") or representations(mpd, "audio")
+    if not reps:
+        return None
+    urls = segment_urls(reps[-1])  # la más liviana
+    return urls["first"] or urls["init"]
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+def probe_stream(stream: dict) -> dict:
+    """Verifica ``stream`` (dict con ``url`` y cabeceras capturadas). Devuelve
+    ``{"ok", "error", "checked", "ttfb", "segment_ttfb", "throughput", "bytes"}``
+    (tiempos en segundos, throughput en bytes/s)."""
+    headers = stream_headers(stream)
+    try:
+        status, final, data, ttfb, _ = _download(stream["url"], headers, MANIFEST_BYTES)
+        if status != 200:
+            return _health(False, f"manifiesto HTTP {status}", ttfb=ttfb, status=status)
+        text = data.decode("utf-8", "replace")
+        if text.lstrip("\ufeff \r\n").startswith("#EXTM3U"):
+            segment = _hls_segment(text, final, headers)
+        elif "<MPD" in text[:2048]:
+            segment = _dash_segment(text, final)
+        else:
+            return _health(False, "no es un manifiesto", ttfb=ttfb)
+        if not segment:
+            return _health(False, "sin segmentos", ttfb=ttfb)
+
+        seg_status, _, seg_data, seg_ttfb, seg_total = _download(segment, headers, SEGMENT_BYTES)
+        if seg_status not in (200, 206) or not seg_data:
+            return _health(False, f"segmento HTTP {seg_status}", ttfb=ttfb, status=seg_status)
+        return _health(True, ttfb=ttfb, segment_ttfb=seg_ttfb,
+                       throughput=round(len(seg_data) / max(seg_total, 1e-3)),
+                       bytes=len(seg_data))
+    except Exception as e:
+        return _health(False, type(e).__name__)
+
+
+def with_health(stream: dict) -> dict:
+    """Copia de ``stream`` con el resultado de ``probe_stream`` en ``"health"``."""
+    return dict(stream, health=probe_stream(stream))
+
+
+def validate(streams: List[Optional[dict]], workers: int = WORKERS) -> List[Optional[dict]]:
+    """``with_health`` en paralelo sobre ``streams`` (los None quedan None), mismo orden."""
+    checked = run_parallel([lambda s=s: with_health(s) for s in streams if s], workers)
+    it = iter(checked)
+    return [next(it) if s else None for s in streams]
+
+
+def is_alive(stream: Optional[dict]) -> bool:
+    """True si el stream pasó la verificación (o nunca se verificó)."""
+    return bool(stream) and stream.get("health", {"ok": True})["ok"]
+
+
+def rejected(stream: Optional[dict]) -> bool:
+    """True si el origen rechazó el stream con un HTTP 4xx (token vencido o
+    revocado), a diferencia de un timeout o un corte pasajero."""
+    status = ((stream or {}).get("health") or {}).get("status", 0)
+    return 400 <= status < 500
+
+
+def rank_key(stream: Optional[dict]) -> tuple:
+    """Clave de orden entre espejos: vivos primero, después mayor throughput y menor TTFB."""
+    health = (stream or {}).get("health") or {}
+    return (not is_alive(stream), -health.get("throughput", 0), health.get("ttfb", PROBE_TIMEOUT))
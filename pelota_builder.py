@@ -3,18 +3,35 @@
 """
 pelota_builder.py – Generador de eventos.m3u desde múltiples fuentes
 """
+import json
 import re
 import time
 import os
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
 from pathlib import Path
-from git import Repo, exc as git_exc
-import requests
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from git_publish import publish
 from bs4 import BeautifulSoup
 from seleniumwire import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
+from browser_pool import BrowserPool
+from http_pool import HEADERS, close_session, fetch, run_parallel
+from iframe_crawler import crawl
+from hls_playlist import attach_variants, fetch_playlist, renditions
+from liveness import is_alive, rank_key, rejected, validate, with_health
+from stream_cache import FailureCache, LifetimeStats, StreamCache, SuccessStats, url_expiry
+from refresh import RefreshPlanner
+from scheduler import Budget, WorkQueue, any_in_window, parse_kickoff, priority
+from selenium import webdriver as selenium_webdriver
+from capture import (attach_cdp_recorder, clear_captures, configure_interception,
+                     enable_cdp_logging, quiet_chrome, seleniumwire_options,
+                     wait_for_manifest, wait_for_page)
 
 # ───────────── Configuración ─────────────
 ROJA_URL       = "https://www.rojadirectaenvivo.pl/"
@@ -26,7 +43,76 @@ PELOTA1_URL    = "https://www.pelotalibre1.pe/"
 REPO_DIR       = Path(__file__).parent
 EVENT_FILE     = "eventos.m3u"
 CDN_URL        = f"https://raw.githubusercontent.com/felamachado/canalesTV/main/{EVENT_FILE}"
-SLOW_WAIT      = 4
+# Caché de streams resueltos (ver stream_cache.py)
+CACHE_FILE     = ".stream_cache.json"
+CACHE_TTL      = 20 * 60  # segundos, si la URL del stream no trae vencimiento
+FAILURE_FILE   = ".failure_cache.json"  # páginas sin stream, en backoff exponencial
+STATS_FILE     = ".host_stats.json"     # aciertos por host, para priorizar
+LIFETIME_FILE  = ".stream_lifetimes.json"  # duración observada de streams sin vencimiento en la URL
+
+# Presupuesto de la corrida (el cron corre cada 30 min)
+RUN_BUDGET     = 25 * 60  # segundos totales
+BUDGET_RESERVE = 30       # no empezar páginas nuevas con menos de esto
+PUBLISH_EVERY  = 3        # reescribir playlists cada N streams nuevos
+
+# Zona horaria en que cada fuente publica sus horas (HH:MM sin zona, escrita
+# en el HTML). Se asume la del país de su público/dominio; para verificar una
+# fuente, comparar la hora de un partido conocido con la oficial.
+SOURCE_TZ      = {
+    "RojaDirecta":  "America/Montevideo",
+    "FutbolLibre":  "America/Mexico_City",
+    "LibrePelota":  "America/Montevideo",
+    "PelotaLibre1": "America/Lima",
+}
+DEFAULT_SOURCE_TZ = "America/Montevideo"  # fuentes sin entrada en SOURCE_TZ
+# Ventana de kickoff: solo se resuelven eventos empezados hace menos de
+# WINDOW_BEFORE_H horas o que empiezan dentro de WINDOW_AFTER_H horas
+WINDOW_BEFORE_H = 2
+WINDOW_AFTER_H  = 1
+
+# Backend de captura de red: "wire" (proxy selenium-wire) o "cdp" (DevTools, sin proxy)
+CAPTURE_BACKEND = os.environ.get("CAPTURE_BACKEND", "wire")
+
+# Esperas máximas (segundos); vuelven antes si aparece el manifiesto / el DOM
+RENDER_WAIT    = 5    # agenda renderizada por JS
+LOAD_WAIT      = 3    # manifiesto tras cargar la página, sin interactuar
+CLICK_WAIT     = 0.5  # manifiesto tras cada clic de play
+SLOW_WAIT      = 4    # manifiesto tras clics en página e iframes
+
+# Qué escribir para un master HLS: "master" (tal cual), "best", "lowest" o
+# "variants" (una entrada por calidad). Ver hls_playlist.py
+RENDITION_MODE = os.environ.get("RENDITION_MODE", "master")
+
+# Verificación de streams antes de publicar (ver liveness.py): "drop" descarta
+# los que no reproducen, "demote" los deja al final de su partido; "off" no verifica
+LIVENESS_POLICY = os.environ.get("LIVENESS_POLICY", "drop")
+# Un stream en caché medido hace menos de esto no se vuelve a sondear (salvo
+# que esté por vencer): en modo daemon cada ciclo lo re-bajaría entero
+HEALTH_RECHECK  = 20 * 60
+
+# Carrera de espejos: por partido se resuelven a la vez hasta RACE_MIRRORS
+# enlaces y se cancela el resto apenas RACE_KEEP dan un stream verificado
+# (RACE_MIRRORS=0 resuelve todos los enlaces, como antes)
+RACE_MIRRORS   = int(os.environ.get("RACE_MIRRORS", 3))
+RACE_KEEP      = int(os.environ.get("RACE_KEEP", 1))
+
+# Modo daemon (--daemon): el proceso queda residente con Chrome y la sesión HTTP abiertos
+AGENDA_EVERY   = 60 * 60  # re-scrapear las agendas de las fuentes
+STREAM_EVERY   = 5 * 60   # revisar eventos que entran en ventana (los vencimientos los agenda RefreshPlanner)
+ERROR_WAIT     = 30       # espera tras un ciclo fallido; se duplica hasta STREAM_EVERY
+
+# Resolución concurrente y pool de navegadores (ver browser_pool.py)
+RESOLVE_WORKERS = 3   # eventos resueltos en paralelo
+POOL_SIZE      = RESOLVE_WORKERS  # drivers Chrome vivos a la vez
+POOL_MAX_PAGES = 25   # páginas por driver antes de reciclarlo
+
+TIME_RE = re.compile(r'(\d{2}:\d{2})')
+
+# Estadísticas por fuente: nombre -> {"tier": "static"|"selenium", "events": n, "seconds": t}
+SOURCE_STATS = {}
+
+# Parámetros de query que no cambian la página (se ignoran al deduplicar; utm_* también)
+TRACKING_PARAMS = {"fbclid", "gclid", "ref"}
 
 # Ligas a incluir/excluir
 INCLUDE_LEAGUES = []
@@ -38,7 +124,8 @@ EXCLUDED_LEAGUES = [
 ]
 
 # ───────────── Drivers ─────────────
-def init_driver() -> webdriver.Chrome:
+def init_driver(backend: str = CAPTURE_BACKEND) -> webdriver.Chrome:
+    """Chrome headless con el backend de captura indicado ("wire" o "cdp")"""
     opts = Options()
     opts.add_argument("--headless=new")
     opts.add_argument("--disable-gpu")
@@ -47,6 +134,7 @@ def init_driver() -> webdriver.Chrome:
     opts.add_argument("--disable-web-security")
     opts.add_argument("--disable-features=VizDisplayCompositor")
     opts.add_argument("--window-size=1920,1080")
+    quiet_chrome(opts)
     
     # Try multiple paths for chromedriver
     paths = [
@@ -72,7 +160,46 @@ def init_driver() -> webdriver.Chrome:
             print(f"Warning: WebDriver Manager failed: {e}")
             pass
 
-    return webdriver.Chrome(service=service, options=opts) if service else webdriver.Chrome(options=opts)
+    kwargs = {"options": opts}
+    if service:
+        kwargs["service"] = service
+
+    if backend == "cdp":
+        try:
+            enable_cdp_logging(opts)
+            driver = selenium_webdriver.Chrome(**kwargs)
+            attach_cdp_recorder(driver)
+            configure_interception(driver)
+            return driver
+        except Exception as e:
+            print(f"Warning: CDP backend failed ({e}), falling back to selenium-wire")
+
+    driver = webdriver.Chrome(seleniumwire_options=seleniumwire_options(), **kwargs)
+    # Solo guardar manifiestos y bloquear imágenes/fuentes/segmentos/ads
+    configure_interception(driver)
+    return driver
+
+_POOL = None
+_CACHE = None
+_FAILURES = None
+_STATS = None
+_LIFETIMES = None
+OUT_OF_BUDGET = object() # marca de trabajo no iniciado por falta de tiempo
+CANCELLED = object()     # marca de espejo descartado: su partido ya tiene stream
+
+def get_pool() -> BrowserPool:
+    """Pool compartido de drivers para toda la ejecución (se crea al primer uso)"""
+    global _POOL
+    if _POOL is None:
+        _POOL = BrowserPool(init_driver, size=POOL_SIZE, max_pages=POOL_MAX_PAGES,
+                            clear_captures=clear_captures)
+    return _POOL
+
+def close_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.close()
+        _POOL = None
 
 # ───────────── Scrapers de Eventos ─────────────
 
@@ -85,9 +212,10 @@ def normalize(url: str) -> str:
 def get_roja_events() -> list:
     """Scraper original de RojaDirecta (basado en HTML estatico si es posible)"""
     events = []
+    t0 = time.time()
     try:
         print(f"Scraping RojaDirecta: {ROJA_URL}")
-        resp = requests.get(ROJA_URL, timeout=10)
+        resp = fetch(ROJA_URL)
         soup = BeautifulSoup(resp.text, "html.parser")
         
         for li in soup.select("ul.menu > li"):
@@ -104,107 +232,189 @@ def get_roja_events() -> list:
                 href = normalize(chan_link.get("href", "").strip())
                 if not href: continue
                 chan_name = chan_link.text.strip()
-                events.append((liga, hora, partido, chan_name, href))
+                events.append((liga, hora, partido, chan_name, href, "RojaDirecta"))
     except Exception as e:
         print(f"Error scraping RojaDirecta: {e}")
+    SOURCE_STATS["RojaDirecta"] = {"tier": "static", "events": len(events), "seconds": round(time.time() - t0, 1)}
     return events
 
-def get_futbollibre_style_events(url: str, source_name: str) -> list:
-    """Scraper para sitios tipo FutbolLibre/LibrePelota usando Selenium"""
-    events = []
-    driver = init_driver()
+def agenda_event(href: str, text: str, source_name: str):
+    """Convierte un enlace de agenda (href + texto con HH:MM) en tupla de evento
+    ``(liga, hora, partido, canal, url, fuente)``"""
+    if not href or "#" in href or "whatsapp" in href: return None
+    match = TIME_RE.search(text)
+    if not match: return None
+    hora = match.group(1)
+    # Limpiar texto para obtener titulo
+    full_text = text.replace(hora, "").replace("\n", " ").strip()
+    
+    if ":" in full_text:
+        parts = full_text.split(":", 1)
+        liga = parts[0].strip()
+        partido = parts[1].strip()
+    else:
+        liga = "Varios"
+        partido = full_text
+    
+    chan_name = f"{source_name} Stream"
+    return (liga, hora, partido, chan_name, href, source_name)
+
+def valid_agenda(events: list) -> bool:
+    """Valida el resultado del camino estático antes de aceptarlo"""
+    if not events: return False
+    if not all(e[4].startswith("http") for e in events): return False
+    return any(e[2] for e in events) # al menos un partido con título
+
+# ───────────── Escaneo de páginas fuente ─────────────
+# Cada página fuente se carga una sola vez por ejecución; de un mismo escaneo
+# salen varias vistas (agenda de eventos, canales fijos, iframes embebidos).
+
+# Recorre la página en el navegador y devuelve en un único JSON:
+# - anchors: href, texto propio y texto del ancestro más cercano (hasta 3
+#   niveles) que contenga HH:MM (solo si el enlace no tiene hora propia)
+# - iframes: src de todos los <iframe>
+SCAN_PAGE_JS = r"""
+const timeRe = /\d{2}:\d{2}/;
+const anchors = [];
+for (const a of document.querySelectorAll('a')) {
+    const text = a.innerText || '';
+    let context = '';
+    if (!timeRe.test(text)) {
+        let el = a;
+        for (let i = 0; i < 3 && el.parentElement; i++) {
+            el = el.parentElement;
+            const t = el.innerText || '';
+            if (timeRe.test(t)) { context = t; break; }
+        }
+    }
+    anchors.push({href: a.href || '', text: text, context: context});
+}
+const iframes = Array.from(document.querySelectorAll('iframe'))
+    .map(f => f.src).filter(Boolean);
+return JSON.stringify({anchors: anchors, iframes: iframes});
+"""
+
+_SCANS = {} # url -> {"tier", "anchors", "iframes"}
+
+def _static_scan(url: str) -> dict:
+    """Camino rápido: HTML inicial con requests + BeautifulSoup"""
+    resp = fetch(url)
+    resp.raise_for_status()
+    soup = BeautifulSoup(resp.text, "html.parser")
+    anchors = []
+    for a in soup.find_all("a", href=True):
+        raw = a["href"].strip()
+        if not raw or raw.startswith("#"): continue
+        text = a.get_text("\n", strip=True)
+        context = ""
+        # Si no hay hora en el enlace, buscar en hasta 3 contenedores padre
+        if not TIME_RE.search(text):
+            for parent in list(a.parents)[:3]:
+                p_txt = parent.get_text("\n", strip=True)
+                if TIME_RE.search(p_txt):
+                    context = p_txt
+                    break
+        anchors.append({"href": urljoin(resp.url, raw), "text": text, "context": context})
+    iframes = [urljoin(resp.url, f["src"]) for f in soup.find_all("iframe", src=True)]
+    return {"tier": "static", "anchors": anchors, "iframes": iframes}
+
+def _render_scan(url: str) -> dict:
+    """Camino lento: página renderizada por JS en Chrome (una sola llamada WebDriver)"""
+    scan = {"tier": "selenium", "anchors": [], "iframes": []}
+    pool = get_pool()
+    driver = pool.checkout()
+    failed = False
     try:
-        print(f"Scraping {source_name}: {url}")
         driver.get(url)
-        time.sleep(5) # Esperar carga de JS
-        
-        # Buscar enlaces que contengan un tiempo
-        # Estrategia: Buscar todos los 'a', chequear si tienen hijo 'time' o texto tipo XX:XX
-        links = driver.find_elements(By.TAG_NAME, "a")
-        
-        for a in links:
-            try:
-                href = a.get_attribute("href")
-                if not href or "#" in href or "whatsapp" in href: continue
-                
-                # Check for time element or text
-                text = a.text
-                match = re.search(r'(\d{2}:\d{2})', text)
-                
-                # Si no encuentra hora en el enlace, buscar en padres (traversal)
-                if not match:
-                    el = a
-                    for _ in range(3): # Subir hasta 3 niveles
-                        try:
-                            el = el.find_element(By.XPATH, "..")
-                            p_txt = el.text
-                            match = re.search(r'(\d{2}:\d{2})', p_txt)
-                            if match:
-                                text = p_txt # Usar texto del contenedor padre
-                                break
-                        except:
-                            break
-                
-                if match:
-                    hora = match.group(1)
-                    # Limpiar texto para obtener titulo
-                    full_text = text.replace(hora, "").replace("\n", " ").strip()
-                    
-                    if ":" in full_text:
-                        parts = full_text.split(":", 1)
-                        liga = parts[0].strip()
-                        partido = parts[1].strip()
-                    else:
-                        liga = "Varios"
-                        partido = full_text
-                    
-                    chan_name = f"{source_name} Stream"
-                    events.append((liga, hora, partido, chan_name, href))
-            except:
-                continue
-                
+        # Esperar carga de JS: hasta que aparezca alguna hora HH:MM en la página
+        wait_for_page(driver, RENDER_WAIT, r"/\d{2}:\d{2}/.test(document.body.innerText)")
+        scan.update(json.loads(driver.execute_script(SCAN_PAGE_JS) or "{}"))
     except Exception as e:
-        print(f"Error scraping {source_name}: {e}")
+        print(f"Error rendering {url}: {e}")
+        failed = True
     finally:
-        driver.quit()
+        pool.checkin(driver, failed=failed)
+    return scan
+
+def scan_page(url: str, render: bool = False) -> dict:
+    """Escanea ``url`` una vez por ejecución y devuelve {"tier", "anchors", "iframes"}.
+    Sin ``render`` prueba primero el HTML estático; con ``render`` fuerza Chrome
+    (reutilizando un escaneo renderizado previo si existe)."""
+    cached = _SCANS.get(url)
+    if cached and (cached["tier"] == "selenium" or not render):
+        return cached
+    scan = None
+    if not render:
+        try:
+            scan = _static_scan(url)
+        except Exception as e:
+            print(f"  Static fetch failed for {url}: {e}")
+    if scan is None:
+        scan = _render_scan(url)
+    _SCANS[url] = scan
+    return scan
+
+def clear_scans():
+    _SCANS.clear()
+
+def agenda_from_scan(scan: dict, source_name: str) -> list:
+    """Vista agenda: enlaces con hora convertidos en eventos"""
+    events = []
+    for a in scan["anchors"]:
+        # context solo viene cargado si el enlace no tiene hora propia
+        ev = agenda_event(a["href"], a["context"] or a["text"], source_name)
+        if ev: events.append(ev)
     return events
 
-def get_fixed_channels(url: str) -> list:
-    """Obtiene canales fijos de LibrePelota (barra navegación)"""
+def fixed_channels_from_scan(scan: dict) -> list:
+    """Vista canales fijos: enlaces de la barra de navegación a /en-vivo/"""
     channels = []
-    driver = init_driver()
-    try:
-        print(f"Scraping Fixed Channels from: {url}")
-        driver.get(url)
-        time.sleep(3)
-        
-        links = driver.find_elements(By.TAG_NAME, "a")
-        seen = set()
+    seen = set()
+    for a in scan["anchors"]:
+        href = a["href"]
+        txt = a["text"].strip()
+        if not href: continue
         
-        for a in links:
-            try:
-                href = a.get_attribute("href")
-                txt = a.text.strip()
-                if not href: continue
-                
-                # Criterio: URL contiene 'en-vivo' y el texto es corto (nombre de canal)
-                if "/en-vivo/" in href and len(txt) > 2 and len(txt) < 30 and "partido" not in txt.lower() and "ver" not in txt.lower():
-                    if txt not in seen:
-                        # Crear entrada M3U provisional (sin stream URL aun)
-                        channels.append((txt, href))
-                        seen.add(txt)
-            except:
-                continue
-    except Exception as e:
-        print(f"Error scraping fixed channels: {e}")
-    finally:
-        driver.quit()
+        # Criterio: URL contiene 'en-vivo' y el texto es corto (nombre de canal)
+        if "/en-vivo/" in href and len(txt) > 2 and len(txt) < 30 and "partido" not in txt.lower() and "ver" not in txt.lower():
+            if txt not in seen:
+                # Crear entrada M3U provisional (sin stream URL aun)
+                channels.append((txt, href))
+                seen.add(txt)
+    return channels
+
+def get_futbollibre_style_events(url: str, source_name: str) -> list:
+    """Scraper para sitios tipo FutbolLibre/LibrePelota.
+    Primero intenta el HTML estático; si no da eventos válidos, usa Selenium."""
+    print(f"Scraping {source_name}: {url}")
+    t0 = time.time()
+    scan = scan_page(url)
+    events = agenda_from_scan(scan, source_name)
+    if not valid_agenda(events) and scan["tier"] == "static":
+        scan = scan_page(url, render=True)
+        events = agenda_from_scan(scan, source_name)
+    SOURCE_STATS[source_name] = {"tier": scan["tier"], "events": len(events), "seconds": round(time.time() - t0, 1)}
+    print(f"  {source_name}: {len(events)} eventos via {scan['tier']}")
+    return events
+
+def print_source_stats():
+    for name, st in SOURCE_STATS.items():
+        print(f"  [{st['tier']:<8}] {name:<14} {st['events']:>4} eventos en {st['seconds']}s")
+
+def get_fixed_channels(url: str) -> list:
+    """Obtiene canales fijos de LibrePelota (barra navegación), reutilizando el escaneo de la agenda"""
+    print(f"Scraping Fixed Channels from: {url}")
+    scan = scan_page(url)
+    channels = fixed_channels_from_scan(scan)
+    if not channels and scan["tier"] == "static":
+        channels = fixed_channels_from_scan(scan_page(url, render=True))
     return channels
 
 # ───────────── Extracción de Stream (M3U8) ─────────────
 
-def click_play_buttons(drv):
-    """Intenta hacer clic en botones de play"""
+def click_play_buttons(drv) -> bool:
+    """Intenta hacer clic en botones de play. Devuelve True si tras un clic ya
+    apareció un manifiesto en la red (no hace falta seguir clickeando)."""
     try:
         selectors = [
             "button[aria-label*='play']", ".play-button", ".vjs-play-control", 
@@ -218,193 +428,644 @@ def click_play_buttons(drv):
             try:
                 if el.is_displayed():
                     drv.execute_script("arguments[0].click();", el)
-                    time.sleep(0.5)
                     count += 1
+                    if wait_for_manifest(drv, CLICK_WAIT):
+                        return True
             except: pass
     except: pass
+    return False
+
+def decode_stream(url: str) -> dict:
+    """Intento sin navegador: sigue los iframes por HTTP aplicando los
+    decodificadores de ``decoders.py``. Mismo dict que ``extract_m3u8`` (con
+    ``health`` ya medido) o None. El hit se verifica antes de aceptarlo: en
+    estas páginas abundan players de publicidad y URLs fijas vencidas, y
+    aceptarlo sin más evitaría el navegador, que sí daría con el bueno."""
+    hit = crawl(url)
+    if not hit:
+        return None
+    parts = urlsplit(hit["referer"])
+    stream = with_health({
+        "url": hit["url"],
+        "referer": hit["referer"],
+        "user_agent": HEADERS["User-Agent"],
+        "origin": f"{parts.scheme}://{parts.netloc}",
+        "cookie": "",
+    })
+    if not is_alive(stream):
+        print(f"  🧩 Decodificado sin navegador pero no reproduce ({stream['health']['error']}): {hit['url']}")
+        return None
+    print(f"  🧩 Decodificado sin navegador ({hit['via']}): {hit['url']}")
+    return attach_variants(stream)
+
+
+def request_headers(req) -> dict:
+    """Cabeceras de una petición capturada que el player necesita para reproducir."""
+    return {k: req.headers.get(k) for k in ("Referer", "User-Agent", "Origin", "Cookie")
+            if req.headers.get(k)}
+
+
+def pick_manifest(candidates: list):
+    """Entre los manifiestos capturados, el master HLS más reciente (no un chunklist
+    que vence en segundos); si no hay master, el último. Devuelve (request, playlist)."""
+    # El player re-pide el chunklist en vivo cada pocos segundos: una sola
+    # descarga por URL, con la última petición (sus cabeceras son las vigentes)
+    latest = {r.url: i for i, r in enumerate(candidates) if ".m3u8" in r.url}
+    hls = [candidates[i] for i in sorted(latest.values())]
+    playlists = run_parallel([lambda r=r: fetch_playlist(r.url, request_headers(r)) for r in hls])
+    masters = [(r, p) for r, p in zip(hls, playlists) if p and p["kind"] == "master"]
+    if masters:
+        return masters[-1]
+    last = candidates[-1]
+    for r, p in zip(hls, playlists):
+        if r is last:
+            return last, p
+    return last, None
+
+
+def extract_m3u8(url: str, cancel: threading.Event = None) -> dict:
+    """Extrae el m3u8 de una URL: primero con los decodificadores HTTP y si no
+    alcanza, con Selenium Wire y clics inteligentes. Retorna dict con url y headers.
+    Si ``cancel`` se activa (otro espejo ya ganó) abandona antes del próximo paso caro."""
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+
+    try:
+        stream_data = decode_stream(url)
+    except Exception as e:
+        print(f"Warning: decodificación HTTP falló en {url}: {e}")
+        stream_data = None
+    if stream_data or cancelled():
+        return stream_data
 
-def extract_m3u8(url: str) -> dict:
-    """Extrae el m3u8 de una URL usando Selenium Wire y clics inteligentes. Retorna dict con url y headers."""
-    driver = init_driver()
-    stream_data = None
+    pool = get_pool()
+    driver = pool.checkout()
+    failed = False
+    candidates = []
     
     try:
+        if cancelled():
+            return None
         driver.set_page_load_timeout(20)
         try:
             driver.get(url)
         except: pass
         
-        time.sleep(3)
-        click_play_buttons(driver)
-        
-        # Buscar iframes
-        iframes = driver.find_elements(By.TAG_NAME, "iframe")
-        for i in range(min(len(iframes), 3)):
-            try:
-                driver.switch_to.default_content()
-                iframes = driver.find_elements(By.TAG_NAME, "iframe") # refresh
-                if i < len(iframes):
-                    driver.switch_to.frame(iframes[i])
-                    click_play_buttons(driver)
-                    # Nested
-                    nested = driver.find_elements(By.TAG_NAME, "iframe")
-                    if nested:
-                        driver.switch_to.frame(nested[0])
-                        click_play_buttons(driver)
-            except: pass
+        # Si el player arranca solo, el manifiesto aparece sin interactuar
+        candidates = wait_for_manifest(driver, LOAD_WAIT)
+        if not candidates and not cancelled():
+            found = click_play_buttons(driver)
             
-        driver.switch_to.default_content()
-        time.sleep(4)
-        
-        # Capturar requests - Priorizar requests exitosos (status 200)
-        candidates = []
-        for req in driver.requests:
-            if req.response and ('.m3u8' in req.url or '.mpd' in req.url):
-                # Filter out master playlists if we can find a specific chunklist, 
-                # but many times master is what we want. 
-                # Just avoid duplicates and 404s.
-                if req.response.status_code in [200, 206]:
-                   candidates.append(req)
-        
-        # Prefer the last successful request (most likely the playing one)
-        found_req = candidates[-1] if candidates else None
-        
-        if found_req:
-            # Capture relevant headers for VLC
-            headers = found_req.headers
-            stream_data = {
-                "url": found_req.url,
-                "referer": headers.get("Referer", ""),
-                "user_agent": headers.get("User-Agent", ""),
-                "origin": headers.get("Origin", ""),
-                "cookie": headers.get("Cookie", "")
-            }
+            # Buscar iframes
+            iframes = driver.find_elements(By.TAG_NAME, "iframe")
+            for i in range(min(len(iframes), 3)):
+                if found: break
+                try:
+                    driver.switch_to.default_content()
+                    iframes = driver.find_elements(By.TAG_NAME, "iframe") # refresh
+                    if i < len(iframes):
+                        driver.switch_to.frame(iframes[i])
+                        found = click_play_buttons(driver)
+                        # Nested
+                        nested = driver.find_elements(By.TAG_NAME, "iframe")
+                        if nested and not found:
+                            driver.switch_to.frame(nested[0])
+                            found = click_play_buttons(driver)
+                except: pass
+                
+            driver.switch_to.default_content()
+            # Capturar requests - solo manifiestos exitosos (status 200/206)
+            candidates = wait_for_manifest(driver, SLOW_WAIT)
                     
     except Exception as e:
         print(f"Error extracting stream from {url}: {e}")
+        failed = True
     finally:
-        driver.quit()
-    return stream_data
+        pool.checkin(driver, failed=failed)
 
-# ───────────── Main ─────────────
+    if not candidates or cancelled():
+        return None
+    # Preferir el master; si no, el último pedido (el que está sonando).
+    # Se sondea por HTTP con el driver ya devuelto al pool.
+    found_req, playlist = pick_manifest(candidates)
+    # Capture relevant headers for VLC
+    headers = found_req.headers
+    stream_data = {
+        "url": found_req.url,
+        "referer": headers.get("Referer", ""),
+        "user_agent": headers.get("User-Agent", ""),
+        "origin": headers.get("Origin", ""),
+        "cookie": headers.get("Cookie", "")
+    }
+    return attach_variants(stream_data, playlist)
 
-def main():
-    all_events = []
+# ───────────── Resolución concurrente ─────────────
+
+def canonical_url(url: str) -> str:
+    """Forma canónica de una URL para detectar páginas repetidas entre fuentes:
+    https, host en minúsculas, sin fragmento, sin barra final ni parámetros de tracking."""
+    parts = urlsplit(normalize(url.strip()))
+    host = parts.netloc.lower()
+    if host.endswith(":80") or host.endswith(":443"):
+        host = host.rsplit(":", 1)[0]
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    )
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+def get_cache() -> StreamCache:
+    """Caché de streams compartida (se carga del disco al primer uso)"""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = StreamCache(REPO_DIR / CACHE_FILE, default_ttl=CACHE_TTL)
+    return _CACHE
+
+def get_failures() -> FailureCache:
+    """Caché negativa: páginas sin stream en backoff (se carga al primer uso)"""
+    global _FAILURES
+    if _FAILURES is None:
+        _FAILURES = FailureCache(REPO_DIR / FAILURE_FILE)
+    return _FAILURES
+
+def get_stats() -> SuccessStats:
+    """Aciertos por host, para priorizar fuentes que suelen funcionar"""
+    global _STATS
+    if _STATS is None:
+        _STATS = SuccessStats(REPO_DIR / STATS_FILE)
+    return _STATS
+
+def get_lifetimes() -> LifetimeStats:
+    """Duración observada por host de streams sin vencimiento declarado"""
+    global _LIFETIMES
+    if _LIFETIMES is None:
+        _LIFETIMES = LifetimeStats(REPO_DIR / LIFETIME_FILE)
+    return _LIFETIMES
+
+def resolve_streams(jobs: list, workers: int = RESOLVE_WORKERS, budget: Budget = None,
+                    on_progress=None, race: int = RACE_MIRRORS, keep: int = RACE_KEEP,
+                    refresh: frozenset = frozenset()) -> list:
+    """Ejecuta extract_m3u8 sobre cada trabajo ``(url, source, kickoff, match)``
+    con un pool acotado de hilos. Las URLs que apuntan a la misma página (ver
+    canonical_url) se resuelven una sola vez; las que tienen un stream vigente
+    en caché no abren Chrome, las que fallaron hace poco esperan su backoff y
+    las de eventos fuera de la ventana de kickoff quedan para otra corrida.
     
-    # 1. Obtener eventos de todas las fuentes
-    all_events.extend(get_roja_events())
-    all_events.extend(get_futbollibre_style_events(FUTLIB_URL, "FutbolLibre"))
-    all_events.extend(get_futbollibre_style_events(LIBPEL_URL, "LibrePelota"))
-    all_events.extend(get_futbollibre_style_events(PELOTA1_URL, "PelotaLibre1"))
+    El resto se resuelve por prioridad (cercanía al kickoff y tasa de éxito del
+    host) mientras quede ``budget``; cada PUBLISH_EVERY aciertos se llama a
+    ``on_progress(resultados_parciales)`` para publicar lo que ya hay.
     
-    # 2. Filtrar y ordenar
-    unique_events = {} # Key: (hora, partido) -> data
+    Con ``race > 0`` los espejos de un mismo ``match`` corren como carrera: a
+    lo sumo ``race`` a la vez, y cuando ``keep`` dieron un stream verificado
+    se cancela el resto.
     
-    for liga, hora, partido, chan, url in all_events:
-        # Filtros Ligas
-        if any(exc.lower() in liga.lower() for exc in EXCLUDED_LEAGUES): continue
-        if INCLUDE_LEAGUES and not any(inc.lower() in liga.lower() for inc in INCLUDE_LEAGUES): continue
-        pass
-
-    # 3. Generar archivo eventos
-    entries = ["#EXTM3U"]
-    print(f"Total raw events found: {len(all_events)}")
+    Las páginas de ``refresh`` (URLs canónicas, las que RefreshPlanner da por
+    vencer) se vuelven a resolver aunque estén en caché, pero su entrada
+    vigente se sigue publicando hasta que otra la reemplace. Devuelve los
+    resultados en el mismo orden que ``jobs``."""
+    if not jobs:
+        return []
+    unique = {} # canonical -> (primera URL original, source, [kickoffs], {matches})
+    for url, source, kickoff, match in jobs:
+        key = canonical_url(url)
+        job = unique.setdefault(key, (url, source, [], set()))
+        job[2].append(kickoff)
+        if match is not None:
+            job[3].add(match)
     
-    # Ordenar
-    all_events.sort(key=lambda x: (x[1], x[0])) # Hora, Liga
+    cache = get_cache()
+    failures = get_failures()
+    stats = get_stats()
+    lifetimes = get_lifetimes()
+    window = {"before": timedelta(hours=WINDOW_BEFORE_H), "after": timedelta(hours=WINDOW_AFTER_H)}
+    resolved = {}
+    queue = WorkQueue()
+    stale = {} # canonical -> entrada vigente que se refresca (se publica hasta reemplazarla)
+    skipped = deferred = dead = 0
+    hits = {key: cache.get(key) for key in unique}
+    hits = {key: hit for key, hit in hits.items() if hit}
+    if hits and LIVENESS_POLICY != "off":
+        # Un stream en caché también puede haber muerto: se reverifican en paralelo
+        # los que están por vencer o cuya última medición ya es vieja
+        now = time.time()
+        recheck = [key for key, hit in hits.items()
+                   if key in refresh or now - (hit.get("health") or {}).get("checked", 0) >= HEALTH_RECHECK]
+        for key, hit in zip(recheck, validate([hits[key] for key in recheck])):
+            hits[key] = hit
+            if is_alive(hit):
+                cache.update(key, hit)  # la medición nueva vale para los próximos ciclos
+    for key, job in unique.items():
+        hit = hits.get(key)
+        if hit and not is_alive(hit):
+            entry = cache.drop(key)  # se vuelve a resolver como si no estuviera
+            if entry and not url_expiry(hit["url"]) and rejected(hit):
+                # Sin vencimiento en la URL y el origen lo rechaza (no un timeout):
+                # aprender cuánto duró de verdad
+                lifetimes.observe(urlsplit(key).netloc, time.time() - entry["stored"])
+            dead += 1
+            hit = None
+        in_window = any_in_window(job[2], **window)
+        if hit and key in refresh and in_window:
+            resolved[key] = stale[key] = hit
+            kickoff = min((k for k in job[2] if k), default=None)
+            queue.push(priority(kickoff, stats.rate(urlsplit(key).netloc)), (key, job))
+        elif hit:
+            resolved[key] = hit
+        elif not in_window:
+            resolved[key] = None
+            deferred += 1
+        elif failures.should_skip(key):
+            resolved[key] = None
+            skipped += 1
+        else:
+            kickoff = min((k for k in job[2] if k), default=None)
+            queue.push(priority(kickoff, stats.rate(urlsplit(key).netloc)), (key, job))
+    print(f"  {len(jobs)} enlaces -> {len(unique)} páginas únicas "
+          f"({len(resolved) - skipped - deferred} en caché, {len(stale)} a refrescar, {skipped} en backoff, "
+          f"{deferred} fuera de ventana, {dead} caídos en caché)")
     
-    # Procesar streams (ESTO LLEVA TIEMPO)
-    processed_count = 0
-    for liga, hora, partido, chan, url in all_events:
-        # Re-aplicar filtro por seguridad
-        if any(exc.lower() in liga.lower() for exc in EXCLUDED_LEAGUES): continue
-        if INCLUDE_LEAGUES and not any(inc.lower() in liga.lower() for inc in INCLUDE_LEAGUES): continue
-        
-        print(f"Procesando: {hora} {liga} - {partido}")
-        result = extract_m3u8(url)
-        if result:
-            title = f"{hora} {liga} – {partido}"
-            entries.append(f'#EXTINF:-1 tvg-name="{chan}" group-title="{liga}", {title} – {chan}')
-            
-            # Add VLC specific headers
-            if result.get("userAgent"): # Normalize key if needed, using lower camelCase in dict
-                entries.append(f'#EXTVLCOPT:http-user-agent={result["userAgent"]}')
-            if result.get("referer"):
-                entries.append(f'#EXTVLCOPT:http-referrer={result["referer"]}')
-            elif result.get("referrer"): # Typo handling
-                 entries.append(f'#EXTVLCOPT:http-referrer={result["referrer"]}')
+    def partial():
+        return [resolved.get(canonical_url(job[0])) for job in jobs]
+    
+    if on_progress and resolved:
+        on_progress(partial())
+    
+    def run(url, cancel):
+        # No empezar páginas nuevas si ya no alcanza el presupuesto
+        if budget and budget.expired(reserve=BUDGET_RESERVE):
+            return OUT_OF_BUDGET
+        if cancel is not None and cancel.is_set():
+            return CANCELLED
+        result = extract_m3u8(url, cancel)
+        if cancel is not None and cancel.is_set() and not result:
+            return CANCELLED
+        # Cada worker verifica su propio stream: la verificación corre en paralelo
+        # (los decodificados por HTTP ya vienen verificados)
+        if result and LIVENESS_POLICY != "off" and "health" not in result:
+            result = with_health(result)
+        return result
+    
+    # Carreras por partido; una página compartida por varios partidos corre sola
+    races = {} # match -> {"wins", "running", "reserve", "futures", "cancel"}
+    def race_of(job):
+        if race <= 0 or len(job[3]) != 1:
+            return None
+        match = next(iter(job[3]))
+        if match not in races:
+            wins = sum(1 for k, j in unique.items()
+                       if j[3] == {match} and k not in stale and is_alive(resolved.get(k)))
+            races[match] = {"wins": wins, "running": 0, "reserve": [], "futures": set(),
+                            "cancel": threading.Event()}
+        return races[match]
+    
+    new_ok = 0
+    out_of_budget = 0
+    cancelled = 0
+    if len(queue):
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            pending = {}
+            def submit(key, job, state):
+                future = executor.submit(run, job[0], state["cancel"] if state else None)
+                pending[future] = (key, job, state)
+                if state:
+                    state["futures"].add(future)
+                    state["running"] += 1
             
-            # Use keys from the new extract_m3u8 (user_agent, referer)
-            ua = result.get("user_agent")
-            ref = result.get("referer")
-            origin = result.get("origin")
-            cookie = result.get("cookie")
+            def drop(key):
+                nonlocal cancelled
+                resolved[key] = stale.get(key)
+                cancelled += 1
             
-            if ua: entries.append(f'#EXTVLCOPT:http-user-agent={ua}')
-            if ref: entries.append(f'#EXTVLCOPT:http-referrer={ref}')
-            if origin: entries.append(f'#EXTVLCOPT:http-origin={origin}')
-            if cookie: entries.append(f'#EXTVLCOPT:http-cookie={cookie}')
+            # El executor arranca las tareas en orden de envío = orden de prioridad
+            for key, job in queue.drain():
+                state = race_of(job)
+                if state and state["wins"] >= keep:
+                    drop(key)  # el partido ya tiene stream en caché
+                elif state and state["running"] >= race:
+                    state["reserve"].append((key, job))
+                else:
+                    submit(key, job, state)
             
-            entries.append(result["url"])
-            processed_count += 1
-        else:
-            print("  -> No stream found")
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, (_, _, kickoffs, _), state = pending.pop(future)
+                    if state:
+                        state["futures"].discard(future)
+                        state["running"] -= 1
+                    result = CANCELLED if future.cancelled() else future.result()
+                    if result is OUT_OF_BUDGET:
+                        resolved[key] = stale.get(key)
+                        out_of_budget += 1
+                        continue
+                    if result is CANCELLED:
+                        drop(key)
+                        continue
+                    alive = is_alive(result)
+                    if alive or key not in stale:
+                        resolved[key] = result if alive or LIVENESS_POLICY == "demote" else None
+                    stats.record(urlsplit(key).netloc, alive)
+                    if alive:
+                        cache.put(key, result, ttl=lifetimes.estimate(urlsplit(key).netloc))
+                        failures.record_success(key)
+                        new_ok += 1
+                        if on_progress and new_ok % PUBLISH_EVERY == 0:
+                            on_progress(partial())
+                    else:
+                        upcoming = [k.timestamp() for k in kickoffs if k]
+                        failures.record_failure(key, min(upcoming) if upcoming else None)
+                    if not state:
+                        continue
+                    state["wins"] += int(alive)
+                    if state["wins"] >= keep:
+                        # Ganó: cancelar los espejos en curso/encolados y las reservas
+                        state["cancel"].set()
+                        for other in list(state["futures"]):
+                            other.cancel()
+                        for reserve_key, _ in state["reserve"]:
+                            drop(reserve_key)
+                        state["reserve"].clear()
+                    elif state["reserve"]:
+                        submit(*state["reserve"].pop(0), state)
+    if cancelled:
+        print(f"  Carrera de espejos: {cancelled} enlaces cancelados (su partido ya tenía stream)")
+    if out_of_budget:
+        print(f"  Presupuesto agotado: {out_of_budget} páginas quedan para la próxima corrida")
+    cache.save()
+    failures.save()
+    stats.save()
+    lifetimes.save()
+    return partial()
+
+def resolve_one(url: str) -> dict:
+    """Resuelve una sola página bajo demanda (servidor local, ver playlist_server.py):
+    caché y si no, extract_m3u8 verificado. Actualiza caché, backoff y estadísticas
+    igual que resolve_streams, pero sin respetar el backoff: alguien quiere verla ya"""
+    key = canonical_url(url)
+    host = urlsplit(key).netloc
+    cache = get_cache()
+    hit = cache.get(key)
+    if hit:
+        return hit
+    result = extract_m3u8(url)
+    if result and LIVENESS_POLICY != "off" and "health" not in result:
+        result = with_health(result)
+    alive = is_alive(result)
+    get_stats().record(host, alive)
+    if alive:
+        cache.put(key, result, ttl=get_lifetimes().estimate(host))
+        get_failures().record_success(key)
+    else:
+        get_failures().record_failure(key)
+    for store in (cache, get_failures(), get_stats()):
+        store.save()
+    return result if alive or LIVENESS_POLICY == "demote" else None
+
+def event_extinf(liga: str, hora: str, partido: str, chan: str) -> str:
+    return f'#EXTINF:-1 tvg-name="{chan}" group-title="{liga}", {hora} {liga} – {partido} – {chan}'
+
+def fixed_extinf(display_name: str) -> str:
+    return f'#EXTINF:-1 group-title="Fijos", {display_name}'
+
+def stream_entry(extinf: str, result: dict) -> list:
+    """Líneas M3U de una entrada: EXTINF, cabeceras VLC y URL del stream"""
+    lines = [extinf]
+    ua = result.get("user_agent")
+    ref = result.get("referer")
+    origin = result.get("origin")
+    cookie = result.get("cookie")
+    
+    if ua: lines.append(f'#EXTVLCOPT:http-user-agent={ua}')
+    if ref: lines.append(f'#EXTVLCOPT:http-referrer={ref}')
+    if origin: lines.append(f'#EXTVLCOPT:http-origin={origin}')
+    if cookie: lines.append(f'#EXTVLCOPT:http-cookie={cookie}')
+    
+    lines.append(result["url"])
+    return lines
+
+def stream_entries(extinf: str, result: dict, mode: str = RENDITION_MODE) -> list:
+    """Como ``stream_entry``, pero según ``mode`` escribe el master o la(s)
+    variante(s) elegidas, con la calidad agregada al título. Los streams que no
+    pasaron la verificación (política "demote") se marcan en el título"""
+    if not is_alive(result):
+        extinf += " (sin señal)"
+    lines = []
+    for label, stream in renditions(result, mode):
+        lines.extend(stream_entry(f"{extinf} [{label}]" if label else extinf, stream))
+    return lines
+
+def write_atomic(path: Path, text: str):
+    """Escribe ``path`` sin que un lector vea nunca un archivo a medio escribir"""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """``write_atomic`` solo si el contenido cambió. Devuelve True si escribió"""
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return False
+    except OSError:
+        pass
+    write_atomic(path, text)
+    return True
+
+def write_playlists(events: list, fixed_channels: list, results: list, verbose: bool = False):
+    """Genera eventos.m3u y playlist.m3u (fijos + eventos, orden hora/liga) a partir
+    de los resultados de resolve_streams; los archivos sin cambios no se reescriben.
+    Devuelve (archivos, n_eventos, n_fijos, cambió_alguno)."""
+    event_results = results[:len(events)]
+    fixed_results = results[len(events):]
+    
+    # Eventos (mismo orden hora/liga); entre espejos de un mismo partido,
+    # primero los que mejor reproducen (ver liveness.rank_key)
+    pairs = list(zip(events, event_results))
+    first_index = {}
+    for i, (event, _) in enumerate(pairs):
+        first_index.setdefault(event[:3], i)
+    pairs.sort(key=lambda pair: (first_index[pair[0][:3]], rank_key(pair[1])))
+    entries = ["#EXTM3U"]
+    processed_count = 0
+    for (liga, hora, partido, chan, url, _), result in pairs:
+        if not result:
+            if verbose: print(f"  -> No stream found: {hora} {liga} - {partido}")
+            continue
+        entries.extend(stream_entries(event_extinf(liga, hora, partido, chan), result))
+        processed_count += 1
 
     out_file = REPO_DIR / EVENT_FILE
-    out_file.write_text("\n".join(entries), encoding="utf-8")
-    print(f"Guardado {out_file} con {processed_count} eventos.")
+    changed = write_if_changed(out_file, "\n".join(entries))
     
-    # 4. Canales Fijos (LibrePelota)
-    fixed_channels = get_fixed_channels(LIBPEL_URL)
+    # Canales fijos
     fixed_entries = []
-    print(f"Procesando {len(fixed_channels)} canales fijos...")
-    
+    fixed_count = 0
     names_count = {}
-    for name, url in fixed_channels:
-        print(f"  Fixed: {name}")
-        result = extract_m3u8(url)
-        if result:
-            # Handle duplicate names if any
-            display_name = name
-            if name in names_count:
-                names_count[name] += 1
-                display_name = f"{name} {names_count[name]}"
-            else:
-                names_count[name] = 1
-                
-            fixed_entries.append(f'#EXTINF:-1 group-title="Fijos", {display_name}')
-            
-            ua = result.get("user_agent")
-            ref = result.get("referer")
-            origin = result.get("origin")
-            cookie = result.get("cookie")
-            
-            if ua: fixed_entries.append(f'#EXTVLCOPT:http-user-agent={ua}')
-            if ref: fixed_entries.append(f'#EXTVLCOPT:http-referrer={ref}')
-            if origin: fixed_entries.append(f'#EXTVLCOPT:http-origin={origin}')
-            if cookie: fixed_entries.append(f'#EXTVLCOPT:http-cookie={cookie}')
+    for (name, url), result in zip(fixed_channels, fixed_results):
+        if not result:
+            continue
+        # Handle duplicate names if any
+        display_name = name
+        if name in names_count:
+            names_count[name] += 1
+            display_name = f"{name} {names_count[name]}"
+        else:
+            names_count[name] = 1
             
-            fixed_entries.append(result["url"])
+        fixed_entries.extend(stream_entries(fixed_extinf(display_name), result))
+        fixed_count += 1
             
-    # 5. Combinar Playlist
+    # Combinar Playlist
     combo_entries = ["#EXTM3U"]
     combo_entries.extend(fixed_entries) # Primero fijos
     if len(entries) > 1:
         combo_entries.extend(entries[1:]) # Luego eventos
         
     combo_file = REPO_DIR / "playlist.m3u"
-    combo_file.write_text("\n".join(combo_entries), encoding="utf-8")
-    print("Playlist combinada generada.")
+    changed = write_if_changed(combo_file, "\n".join(combo_entries)) or changed
+    return (out_file, combo_file), processed_count, fixed_count, changed
+
+# ───────────── Main ─────────────
+
+def gather_events():
+    """Eventos de todas las fuentes (filtrados por liga, orden hora/liga) y canales fijos"""
+    all_events = []
+    clear_scans()
+    
+    # Fuentes en paralelo
+    sources = run_parallel([
+        get_roja_events,
+        lambda: get_futbollibre_style_events(FUTLIB_URL, "FutbolLibre"),
+        lambda: get_futbollibre_style_events(LIBPEL_URL, "LibrePelota"),
+        lambda: get_futbollibre_style_events(PELOTA1_URL, "PelotaLibre1"),
+    ])
+    for found in sources:
+        all_events.extend(found or [])
+    print(f"Total raw events found: {len(all_events)}")
+    print_source_stats()
+    
+    # Canales Fijos (LibrePelota)
+    fixed_channels = get_fixed_channels(LIBPEL_URL)
+    
+    # Filtrar y ordenar
+    events = []
+    for event in all_events:
+        liga = event[0]
+        # Filtros Ligas
+        if any(exc.lower() in liga.lower() for exc in EXCLUDED_LEAGUES): continue
+        if INCLUDE_LEAGUES and not any(inc.lower() in liga.lower() for inc in INCLUDE_LEAGUES): continue
+        events.append(event)
     
-    # 6. Git Push
+    events.sort(key=lambda x: (x[1], x[0])) # Hora, Liga
+    return events, fixed_channels
+
+def resolve_and_write(events: list, fixed_channels: list, budget: Budget, refresh: frozenset = frozenset()):
+    """Resuelve los streams publicando a medida que salen y escribe los playlists
+    finales (``refresh``: ver resolve_streams). Devuelve lo mismo que
+    write_playlists; ``cambió`` cuenta también las publicaciones parciales"""
+    jobs = [(url, chan, parse_kickoff(hora, SOURCE_TZ.get(source, DEFAULT_SOURCE_TZ)), (liga, hora, partido))
+            for liga, hora, partido, chan, url, source in events]
+    jobs += [(url, "Fijos", None, None) for _, url in fixed_channels]
+    print(f"Resolviendo {len(events)} eventos y {len(fixed_channels)} canales fijos con {RESOLVE_WORKERS} workers "
+          f"({budget.remaining():.0f}s de presupuesto)...")
+    
+    changed = False
+    def publish(partial):
+        nonlocal changed
+        _, n_events, n_fixed, wrote = write_playlists(events, fixed_channels, partial)
+        changed = changed or wrote
+        print(f"  Publicado parcial: {n_events} eventos + {n_fixed} fijos")
+    
+    results = resolve_streams(jobs, budget=budget, on_progress=publish, refresh=refresh)
+    files, processed_count, fixed_count, wrote = write_playlists(events, fixed_channels, results, verbose=True)
+    return files, processed_count, fixed_count, changed or wrote
+
+def git_push(files, processed_count: int, fixed_count: int):
+    """Commit y push solo si los playlists cambiaron más allá de los tokens
+    (ver git_publish.py: PUBLISH_BRANCH, TOKEN_CHANGES)"""
     try:
-        repo = Repo(REPO_DIR)
-        repo.index.add([str(out_file), str(combo_file)])
-        repo.index.commit(f'Update playlist: {processed_count} events + {len(fixed_entries)//2} fixed')
-        repo.remote('origin').push()
-        print("Pushed to GitHub.")
+        publish(files, f'Update playlist: {processed_count} events + {fixed_count} fixed')
     except Exception as e:
         print(f"Git Error: {e}")
 
+def main():
+    budget = Budget(RUN_BUDGET)
+    
+    # 1–2. Obtener eventos de todas las fuentes, filtrar y ordenar
+    events, fixed_channels = gather_events()
+    
+    # 3. Procesar streams en paralelo (ESTO LLEVA TIEMPO), publicando a medida que salen
+    (out_file, combo_file), processed_count, fixed_count, _ = resolve_and_write(events, fixed_channels, budget)
+    
+    # Ya no se necesita Chrome: liberar los drivers del pool
+    close_pool()
+    
+    print(f"Guardado {out_file} con {processed_count} eventos.")
+    print("Playlist combinada generada.")
+    
+    # 4. Git Push
+    git_push((out_file, combo_file), processed_count, fixed_count)
+
+def daemon(agenda_every: float = AGENDA_EVERY, stream_every: float = STREAM_EVERY):
+    """Modo residente: el pool de Chrome y la sesión HTTP quedan abiertos entre
+    ciclos. Las agendas se re-scrapean cada ``agenda_every`` segundos. Cada
+    stream publicado queda agendado en un RefreshPlanner para re-resolverse
+    poco antes de su vencimiento; el daemon duerme hasta el primero de: ese
+    deadline, la próxima agenda o ``stream_every`` (eventos que entran en
+    ventana). Solo se commitea/pushea si algún playlist cambió."""
+    print(f"Modo daemon: agendas cada {agenda_every / 60:.0f} min, ventana cada {stream_every / 60:.0f} min")
+    cache = get_cache()
+    planner = RefreshPlanner()
+    events = fixed_channels = None
+    next_agenda = 0.0
+    errors = 0  # ciclos fallidos seguidos
+    while True:
+        started = time.monotonic()
+        try:
+            if events is None or started >= next_agenda:
+                # Antes de scrapear: si falla, no se reintenta enseguida
+                next_agenda = started + agenda_every
+                events, fixed_channels = gather_events()
+            # Lo que está por vencer se vuelve a resolver; mientras tanto se
+            # sigue publicando la entrada vigente
+            refresh = frozenset(entry["page"] for entry in planner.due())
+            if refresh:
+                print(f"{len(refresh)} streams por vencer: se re-resuelven")
+            files, processed_count, fixed_count, changed = resolve_and_write(
+                events, fixed_channels, Budget(RUN_BUDGET), refresh)
+            planner.sync(cache)
+            if changed:
+                git_push(files, processed_count, fixed_count)
+            else:
+                print("Sin cambios en los playlists: no se publica.")
+            errors = 0
+        except Exception as e:
+            # Un ciclo fallido no tumba el daemon; Chrome se relanza en el próximo
+            errors += 1
+            print(f"Error en el ciclo: {e}")
+            close_pool()
+        now = time.monotonic()
+        wake = min(next_agenda, started + stream_every)
+        deadline = planner.next_deadline()
+        if deadline is not None:
+            wake = min(wake, now + deadline - time.time())
+        if errors:
+            # Sin esto, un fallo persistente (p. ej. Chrome que no arranca) es un bucle sin pausa
+            wake = max(wake, now + min(ERROR_WAIT * 2 ** (errors - 1), stream_every))
+        time.sleep(max(0.0, wake - now))
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Generador de eventos.m3u / playlist.m3u")
+    parser.add_argument("--daemon", action="store_true",
+                        help="quedar residente y refrescar en el lugar en vez de una sola corrida")
+    args = parser.parse_args()
+    try:
+        if args.daemon:
+            daemon()
+        else:
+            main()
+    except KeyboardInterrupt:
+        print("Interrumpido.")
+    finally:
+        close_pool()
+        close_session()
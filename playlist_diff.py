@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+playlist_diff.py – Comparación semántica de playlists M3U
+
+Entre dos corridas casi todas las URLs cambian aunque los partidos y los
+streams sean los mismos: tokens, firmas y vencimientos en la query o en el
+path (``tok_<JWT>``, ``hdnts=...``, ``expires=...``). Para decidir si vale
+la pena un commit, cada entrada se reduce a una clave
+
+    (grupo, título, identidad del stream)
+
+donde el título es canal + partido (``#EXTINF``) y la identidad es la URL
+(y el Referer/Origin capturados) sin las partes volátiles. Dos playlists son
+"iguales" si tienen el mismo multiconjunto de claves; el orden entre espejos
+(que cambia con cada medición de throughput) tampoco cuenta.
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from stream_cache import EXPIRY_PARAMS, JWT_RE
+
+# Parámetros de query que son credenciales o marcas de tiempo, no parte del stream
+VOLATILE_PARAMS = set(EXPIRY_PARAMS) | {
+    "token", "tok", "t", "st", "ts", "time", "hdnts", "hdnea", "sig", "signature",
+    "hash", "md5", "auth", "wmsauthsign", "policy", "key-pair-id", "sid", "session",
+    "nimblesessionid", "_",
+}
+# Tokens opacos en valores/segmentos: prefijo tok_, hex largo o base64 largo
+# con mayúsculas, minúsculas y dígitos. Sin punto: un nombre con extensión
+# (playlist_1280x720_3000k.m3u8) es un archivo, no una credencial
+OPAQUE_RE = re.compile(
+    r"^(?:tok_[^/]+"
+    r"|[0-9a-fA-F]{16,}"
+    r"|(?=[^.]*[a-z])(?=[^.]*[A-Z])(?=[^.]*\d)[A-Za-z0-9_\-+=%~]{24,})$"
+)
+GROUP_RE = re.compile(r'group-title="([^"]*)"')
+TITLE_RE = re.compile(r'#EXTINF:[^,"]*(?:"[^"]*"[^,"]*)*,(.*)')  # coma fuera de comillas
+# Opciones VLC que identifican el origen del stream (cookie y user-agent no)
+IDENTITY_OPTS = ("#EXTVLCOPT:http-referrer=", "#EXTVLCOPT:http-origin=")
+
+# ---------------------------------------------------------------------------
+# Identidad
+# ---------------------------------------------------------------------------
+
+def _volatile(key: str, value: str) -> bool:
+    return key.lower() in VOLATILE_PARAMS or bool(OPAQUE_RE.match(value)) or bool(JWT_RE.search(value))
+
+
+def stream_identity(url: str) -> str:
+    """``url`` sin esquema, tokens de query ni segmentos de path opacos. El
+    último segmento (el archivo: chunklist, calidad...) nunca se enmascara
+    entero, solo los JWT que tenga adentro."""
+    parts = urlsplit(url.strip())
+    *dirs, name = JWT_RE.sub("*", parts.path).split("/")
+    path = "/".join(["*" if OPAQUE_RE.match(seg) else seg for seg in dirs] + [name])
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _volatile(k, v))
+    return urlunsplit(("", parts.netloc.lower(), path, urlencode(query), "")).lstrip("/")
+
+# ---------------------------------------------------------------------------
+# Playlists
+# ---------------------------------------------------------------------------
+
+def parse_m3u(text: str) -> List[dict]:
+    """Entradas de un playlist: ``{"extinf", "opts", "url"}``."""
+    entries, current = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF"):
+            current = {"extinf": line, "opts": [], "url": ""}
+        elif current is None or not line:
+            continue
+        elif line.startswith("#"):
+            current["opts"].append(line)
+        else:
+            current["url"] = line
+            entries.append(current)
+            current = None
+    return entries
+
+
+def entry_key(entry: dict) -> Tuple[str, str, str]:
+    extinf = entry["extinf"]
+    group = GROUP_RE.search(extinf)
+    title = TITLE_RE.match(extinf)
+    title = title.group(1).strip() if title else extinf
+    origin = [
+        opt.split("=", 1)[0] + "=" + stream_identity(opt.split("=", 1)[1])
+        for opt in entry["opts"] if opt.startswith(IDENTITY_OPTS)
+    ]
+    return group.group(1) if group else "", title, " ".join([stream_identity(entry["url"])] + origin)
+
+
+def semantic_keys(text: Optional[str]) -> Counter:
+    return Counter(entry_key(e) for e in parse_m3u(text or ""))
+
+
+def diff(old: Optional[str], new: Optional[str]) -> Tuple[int, int]:
+    """``(agregadas, quitadas)`` entre dos playlists, por clave semántica."""
+    before, after = semantic_keys(old), semantic_keys(new)
+    return sum((after - before).values()), sum((before - after).values())
+
+
+def meaningful_change(old: Optional[str], new: Optional[str]) -> bool:
+    """True si cambió algo más que tokens, vencimientos u orden de espejos."""
+    return semantic_keys(old) != semantic_keys(new)
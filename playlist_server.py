@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+playlist_server.py – Servidor local de playlists con resolución bajo demanda
+
+En vez de resolver todo de antemano (y publicar tokens que vencen antes de
+que alguien mire), sirve ``eventos.m3u``, ``playlist.m3u`` y ``varios.m3u``
+armados al vuelo desde las agendas, donde cada entrada apunta a
+``http://<host>/play/<id>``. Recién cuando un reproductor pide ese endpoint
+se resuelve la página:
+
+* eventos y fijos: caché de streams y si no, ``extract_m3u8`` (ver
+  ``pelota_builder.resolve_one``),
+* canales de ``canales_varios.py``/``dazn.py``: caché, crawl HTTP y Chromium.
+
+y se responde con el stream: si trae cabeceras capturadas (Referer,
+User-Agent...), un playlist de una entrada con sus ``#EXTVLCOPT``; si no, un
+302. Con ``--relay`` siempre un 302 al relay HLS/DASH de ``hls_relay.py``,
+que inyecta esas cabeceras él mismo. Si varios clientes
+piden la misma entrada a la vez, la resolución corre una sola vez y todos
+esperan su resultado (``Coalescer``). Las agendas se re-scrapean cada
+``AGENDA_EVERY``, también de forma perezosa::
+
+    python playlist_server.py --port 8765
+    vlc http://127.0.0.1:8765/playlist.m3u
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import canales_varios
+import dazn
+import pelota_builder
+from dash_manifest import derive_hls_from_mpd
+from hls_playlist import stream_headers
+from hls_relay import PREFIX as RELAY_PREFIX, Relay, send_response
+from http_pool import Coalescer, close_session, fetch
+from liveness import probe_stream
+
+HOST = "127.0.0.1"
+PORT = 8765
+AGENDA_EVERY = pelota_builder.AGENDA_EVERY  # re-scrapear las agendas
+FAIL_HOLD = 60  # segundos sin reintentar una entrada que no dio stream
+
+PLAYLISTS = {
+    "eventos.m3u": ("eventos",),
+    "playlist.m3u": ("fijos", "eventos"),  # como write_playlists: primero fijos
+    "varios.m3u": ("varios",),
+}
+
+# ---------------------------------------------------------------------------
+# Catálogo
+# ---------------------------------------------------------------------------
+
+def entry_id(page: str) -> str:
+    """Id estable de una página: no cambia entre re-scrapes de la agenda."""
+    return hashlib.sha1(pelota_builder.canonical_url(page).encode("utf-8")).hexdigest()[:12]
+
+
+def _entry(group: str, extinf: str, page: str, resolver: str) -> dict:
+    return {"id": entry_id(page), "group": group, "extinf": extinf, "page": page, "resolver": resolver}
+
+
+def gather_catalog() -> List[dict]:
+    """Entradas de los tres playlists, sin resolver ningún stream:
+    ``{"id", "group", "extinf", "page", "resolver"}``."""
+    events, fixed_channels = pelota_builder.gather_events()
+    entries = [
+        _entry("eventos", pelota_builder.event_extinf(liga, hora, partido, chan), url, "pelota")
+        for liga, hora, partido, chan, url, _ in events
+    ]
+    names_count = {}
+    for name, url in fixed_channels:
+        names_count[name] = names_count.get(name, 0) + 1
+        display_name = f"{name} {names_count[name]}" if names_count[name] > 1 else name
+        entries.append(_entry("fijos", pelota_builder.fixed_extinf(display_name), url, "pelota"))
+    for resolver, canales in (("varios", canales_varios.CANALES), ("dazn", dazn.CANALES)):
+        for name, url in canales:
+            name = canales_varios.clean_spaces(name)
+            entries.append(_entry("varios", f'#EXTINF:-1 tvg-name="{name}" group-title="Varios", {name}',
+                                  url, resolver))
+    return entries
+
+
+class Catalog:
+    """Entradas por id, refrescadas perezosamente cada ``every`` segundos."""
+
+    def __init__(self, gather: Callable[[], List[dict]] = gather_catalog, every: float = AGENDA_EVERY):
+        self.gather = gather
+        self.every = every
+        self._entries: List[dict] = []
+        self._by_id: Dict[str, dict] = {}
+        self._loaded = None  # time.monotonic() del último scrape
+        self._coalescer = Coalescer()
+
+    def _load(self) -> None:
+        entries = self.gather()
+        # Un mismo id puede aparecer en varios partidos (espejo compartido): vale el primero
+        by_id = {}
+        for entry in entries:
+            by_id.setdefault(entry["id"], entry)
+        self._entries, self._by_id = entries, by_id
+        self._loaded = time.monotonic()
+        print(f"Catálogo: {len(entries)} entradas")
+
+    def refresh(self) -> None:
+        if self._loaded is None or time.monotonic() - self._loaded >= self.every:
+            self._coalescer.run("catalog", self._load)
+
+    def get(self, id_: str) -> Optional[dict]:
+        self.refresh()
+        return self._by_id.get(id_)
+
+    def playlist(self, name: str, base: str) -> str:
+        """Texto de ``name`` (ver ``PLAYLISTS``) con cada entrada apuntando a ``base``/play/<id>."""
+        self.refresh()
+        lines = ["#EXTM3U"]
+        for group in PLAYLISTS[name]:
+            for entry in self._entries:
+                if entry["group"] == group:
+                    lines += [entry["extinf"], f"{base}/play/{entry['id']}"]
+        return "\n".join(lines) + "\n"
+
+# ---------------------------------------------------------------------------
+# Resolución
+# ---------------------------------------------------------------------------
+
+def _resolve_channel(module, capture: Callable[[str, str], Optional[str]], page: str) -> Optional[dict]:
+    """Como ``process_channel`` de canales_varios.py/dazn.py, para un solo canal."""
+    headers = module.HEADERS
+    html = fetch(page, headers=headers, timeout=15).text
+    url = capture(page, html)
+    if not url:
+        return None
+    if urlsplit(url).path.lower().endswith(".mpd"):
+        url = derive_hls_from_mpd(url, headers) or url
+    stream = {"url": url, "user_agent": headers["User-Agent"]}
+    if not probe_stream(stream)["ok"]:
+        module.CACHE.drop(page)
+        module.CACHE.save()
+        return None
+    return stream
+
+
+RESOLVERS: Dict[str, Callable[[str], Optional[dict]]] = {
+    "pelota": pelota_builder.resolve_one,
+    "varios": lambda page: _resolve_channel(canales_varios, canales_varios.capture_m3u8, page),
+    "dazn": lambda page: _resolve_channel(dazn, dazn.capture_stream, page),
+}
+
+
+class Resolver:
+    """Resuelve entradas del catálogo bajo demanda, una vez por id a la vez;
+    una entrada que no dio stream no se reintenta hasta pasados ``hold`` segundos."""
+
+    def __init__(self, resolvers: Dict[str, Callable[[str], Optional[dict]]] = RESOLVERS,
+                 hold: float = FAIL_HOLD):
+        self.resolvers = resolvers
+        self.hold = hold
+        self._coalescer = Coalescer()
+        self._lock = threading.Lock()
+        self._failed: Dict[str, float] = {}  # id -> time.monotonic() del fallo
+
+    def _resolve(self, entry: dict) -> Optional[dict]:
+        t0 = time.monotonic()
+        try:
+            stream = self.resolvers[entry["resolver"]](entry["page"])
+        except Exception as e:
+            print(f"  /play/{entry['id']}: {type(e).__name__}: {e}")
+            stream = None
+        with self._lock:
+            if stream:
+                self._failed.pop(entry["id"], None)
+            else:
+                self._failed[entry["id"]] = time.monotonic()
+        print(f"  /play/{entry['id']} {'✔' if stream else '✖'} {entry['page']} ({time.monotonic() - t0:.1f}s)")
+        return stream
+
+    def stream(self, entry: dict) -> Optional[dict]:
+        with self._lock:
+            failed = self._failed.get(entry["id"])
+        if failed is not None and time.monotonic() - failed < self.hold:
+            return None
+        return self._coalescer.run(entry["id"], lambda: self._resolve(entry))
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+class PlaylistHandler(BaseHTTPRequestHandler):
+    server_version = "pelota/1.0"
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "text/plain; charset=utf-8",
+              headers: Optional[dict] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _base(self) -> str:
+        host = self.headers.get("Host") or "%s:%d" % self.server.server_address[:2]
+        return f"http://{host}"
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        name = path.lstrip("/")
+        if name in PLAYLISTS:
+            body = self.server.catalog.playlist(name, self._base()).encode("utf-8")
+            return self._send(200, body, "audio/x-mpegurl; charset=utf-8")
+        if path.startswith("/play/"):
+            entry = self.server.catalog.get(path[len("/play/"):])
+            if entry is None:
+                return self._send(404, b"entrada desconocida\n")
+            stream = self.server.resolver.stream(entry)
+            if not stream:
+                return self._send(502, b"sin stream\n")
+            if self.server.relay:
+                location = self._base() + self.server.relay.register(entry["id"], stream)
+                return self._send(302, headers={"Location": location})
+            if stream_headers(stream):
+                # Un redirect perdería Referer/User-Agent/Origin/Cookie: playlist de
+                # una entrada con las mismas líneas #EXTVLCOPT que los archivos estáticos
+                body = "\n".join(["#EXTM3U"] + pelota_builder.stream_entry(entry["extinf"], stream)) + "\n"
+                return self._send(200, body.encode("utf-8"), "audio/x-mpegurl; charset=utf-8")
+            return self._send(302, headers={"Location": stream["url"]})
+        if self.server.relay and path.startswith(RELAY_PREFIX):
+            return send_response(self, self.server.relay.respond(self.path))
+        self._send(404, b"no encontrado\n")
+
+    do_HEAD = do_GET
+
+    def log_message(self, fmt: str, *args) -> None:
+        if not self.path.startswith(RELAY_PREFIX):  # un pedido por segmento: demasiado ruido
+            print(f"{self.address_string()} - {fmt % args}")
+
+
+class PlaylistServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalog: Optional[Catalog] = None, resolver: Optional[Resolver] = None,
+                 relay: Optional[Relay] = None):
+        super().__init__(address, PlaylistHandler)
+        self.catalog = catalog or Catalog()
+        self.resolver = resolver or Resolver()
+        self.relay = relay
+
+
+def serve(host: str = HOST, port: int = PORT, relay: bool = False) -> None:
+    server = PlaylistServer((host, port), relay=Relay() if relay else None)
+    print(f"Sirviendo playlists en http://{host}:{port}/ ({', '.join(PLAYLISTS)})"
+          + (" con relay HLS" if relay else ""))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de playlists con resolución bajo demanda")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--relay", action="store_true",
+                        help="servir los streams HLS a través del relay con las cabeceras capturadas")
+    args = parser.parse_args()
+    try:
+        serve(args.host, args.port, args.relay)
+    except KeyboardInterrupt:
+        print("Interrumpido.")
+    finally:
+        pelota_builder.close_pool()
+        close_session()
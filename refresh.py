@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+refresh.py – Agenda de re-resolución por vencimiento de token
+
+En vez de reconstruir todo en cada ciclo, ``RefreshPlanner`` sigue cada
+entrada publicada (página de origen, cabeceras capturadas y vencimiento) y
+la agenda para re-resolverse ``lead`` segundos antes de que venza, en un
+min-heap de deadlines. El vencimiento es el que calculó ``StreamCache``:
+
+* ``token``    – JWT ``exp`` o ``expires=``/``exp=``/``e=`` en la URL,
+* ``ttl``      – la duración más corta observada para el host (``LifetimeStats``),
+* ``default``  – ``default_ttl`` si no hay nada mejor.
+
+El daemon duerme hasta el próximo deadline, pide ``due()`` y re-resuelve
+solo esas páginas.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional
+
+from hls_playlist import stream_headers
+from stream_cache import StreamCache
+
+REFRESH_LEAD = 3 * 60  # re-resolver esto antes del vencimiento
+
+
+class RefreshPlanner:
+    """Min-heap ``(deadline, seq, key)`` con borrado perezoso: una entrada vieja
+    del heap se ignora si ``key`` se volvió a agendar o se olvidó."""
+
+    def __init__(self, lead: float = REFRESH_LEAD):
+        self.lead = lead
+        self._heap = []
+        self._seq = itertools.count()
+        self._entries: Dict[str, dict] = {}
+        # key -> expires de la entrada ya entregada por due(): si el refresco no
+        # la reemplazó, no se vuelve a agendar (su deadline ya pasó) hasta que cambie
+        self._attempted: Dict[str, float] = {}
+
+    def track(self, key: str, stream: dict, expires: float, source: str = "default") -> float:
+        """Agenda ``key`` (URL de la página de origen) para antes de ``expires``.
+        Devuelve el deadline (epoch)."""
+        deadline = expires - self.lead
+        self._entries[key] = {
+            "page": key,
+            "url": stream.get("url", ""),
+            "headers": stream_headers(stream),
+            "expires": expires,
+            "source": source,
+            "deadline": deadline,
+        }
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        return deadline
+
+    def forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def sync(self, cache: StreamCache) -> None:
+        """Agenda todo lo que hay en ``cache``; lo que ya no está se olvida."""
+        items = cache.items()
+        current = {key for key, _ in items}
+        for key in list(self._entries):
+            if key not in current:
+                self.forget(key)
+        self._attempted = {k: v for k, v in self._attempted.items() if k in current}
+        for key, entry in items:
+            known = self._entries.get(key)
+            if known and known["expires"] == entry["expires"]:
+                continue
+            if self._attempted.get(key) == entry["expires"]:
+                continue  # refresco fallido: se publica hasta vencer
+            self._attempted.pop(key, None)
+            self.track(key, entry["stream"], entry["expires"], entry.get("source", "default"))
+
+    def _head(self) -> Optional[tuple]:
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry and entry["deadline"] == deadline:
+                return self._heap[0]
+            heapq.heappop(self._heap)  # obsoleta
+        return None
+
+    def next_deadline(self) -> Optional[float]:
+        head = self._head()
+        return head[0] if head else None
+
+    def due(self, now: Optional[float] = None) -> List[dict]:
+        """Saca del plan y devuelve las entradas cuyo deadline ya llegó."""
+        now = time.time() if now is None else now
+        out = []
+        while True:
+            head = self._head()
+            if not head or head[0] > now:
+                return out
+            heapq.heappop(self._heap)
+            entry = self._entries.pop(head[2])
+            self._attempted[head[2]] = entry["expires"]
+            out.append(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
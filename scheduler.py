@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scheduler.py – Qué eventos vale la pena resolver en esta corrida
+
+Las fuentes publican la hora de cada partido como ``HH:MM`` en su zona
+horaria. Un stream tokenizado resuelto 10 horas antes del partido vence mucho
+antes de que alguien lo mire, así que solo se resuelven los eventos dentro de
+una ventana alrededor de ahora (por defecto: empezados hace menos de 2h o que
+empiezan dentro de 1h). El resto queda para corridas posteriores.
+
+Dentro de la ventana, el trabajo se ordena con una cola de prioridad
+(``WorkQueue``): primero lo que está en vivo o más cerca de empezar, y entre
+eso, lo que históricamente resuelve con más éxito. ``Budget`` lleva el tiempo
+total de la corrida para no empezar trabajo nuevo cuando ya no queda.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+from zoneinfo import ZoneInfo
+
+DEFAULT_TZ = "America/Montevideo"
+WINDOW_BEFORE = timedelta(hours=2)  # eventos empezados hace a lo sumo esto
+WINDOW_AFTER = timedelta(hours=1)   # eventos que empiezan dentro de esto
+
+LIVE_SPAN = timedelta(hours=2)      # duración asumida de un evento en vivo
+NO_KICKOFF_MINUTES = 30             # distancia asignada a páginas sin hora (canales fijos)
+
+TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+
+# ---------------------------------------------------------------------------
+# Horas de inicio
+# ---------------------------------------------------------------------------
+
+def parse_kickoff(hora: str, tz: str = DEFAULT_TZ, now: Optional[datetime] = None) -> Optional[datetime]:
+    """``'HH:MM'`` -> datetime con zona horaria, para hoy en ``tz``.
+    Si queda más de 12h en el pasado se asume que es de mañana."""
+    m = TIME_RE.search(hora or "")
+    if not m:
+        return None
+    hh, mm = int(m.group(1)), int(m.group(2))
+    if hh > 23 or mm > 59:
+        return None
+    now = (now or datetime.now(ZoneInfo(tz))).astimezone(ZoneInfo(tz))
+    start = now.replace(hour=hh, minute=mm, second=0, microsecond=0)
+    if start < now - timedelta(hours=12):
+        start += timedelta(days=1)
+    return start
+
+# ---------------------------------------------------------------------------
+# Ventana de resolución
+# ---------------------------------------------------------------------------
+
+def in_window(kickoff: Optional[datetime], now: Optional[datetime] = None,
+              before: timedelta = WINDOW_BEFORE, after: timedelta = WINDOW_AFTER) -> bool:
+    """True si el evento está en vivo o por empezar. Sin hora conocida: True."""
+    if kickoff is None:
+        return True
+    now = now or datetime.now(kickoff.tzinfo)
+    return kickoff - after <= now <= kickoff + before
+
+
+def any_in_window(kickoffs: Iterable[Optional[datetime]], **kwargs) -> bool:
+    """Para páginas compartidas por varios eventos: alcanza con que uno esté en ventana."""
+    return any(in_window(k, **kwargs) for k in kickoffs)
+
+# ---------------------------------------------------------------------------
+# Prioridad y presupuesto
+# ---------------------------------------------------------------------------
+
+def priority(kickoff: Optional[datetime], success_rate: float = 0.5,
+             now: Optional[datetime] = None) -> float:
+    """Menor = se resuelve antes. Minutos al kickoff (0 si está en vivo),
+    divididos por la tasa de éxito histórica (0..1) de la fuente."""
+    if kickoff is None:
+        minutes = NO_KICKOFF_MINUTES
+    else:
+        now = now or datetime.now(kickoff.tzinfo)
+        delta = (kickoff - now).total_seconds() / 60
+        if delta > 0:
+            minutes = delta
+        else:
+            # en vivo: prioridad máxima mientras dura, después decae
+            minutes = max(0.0, -delta - LIVE_SPAN.total_seconds() / 60)
+    return (minutes + 1) / (0.2 + max(0.0, min(1.0, success_rate)))
+
+
+class WorkQueue:
+    """Cola de prioridad (min-heap) estable: a igual prioridad, orden de llegada."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+
+    def push(self, prio: float, item: Any) -> None:
+        heapq.heappush(self._heap, (prio, next(self._seq), item))
+
+    def pop(self) -> Any:
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def drain(self) -> list:
+        """Todos los ítems en orden de prioridad (vacía la cola)."""
+        return [self.pop() for _ in range(len(self))]
+
+
+class Budget:
+    """Presupuesto de tiempo de pared para una corrida."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self, reserve: float = 0.0) -> bool:
+        """True si quedan menos de ``reserve`` segundos."""
+        return self.remaining() <= reserve
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+stream_cache.py – Caché persistente de streams resueltos
+
+Guarda, por URL de página, el dict de stream que devuelve ``extract_m3u8``
+(o ``{"url": ...}`` para ``capture_stream``) junto con su vencimiento:
+
+* Si la URL del stream trae un token JWT con ``exp`` (p.ej. las rutas
+  ``tok_<JWT>`` de cvattv) o un parámetro de query tipo ``expires=``/``exp=``/
+  ``e=``, el vencimiento sale de ahí.
+* Si no, se usa ``default_ttl``.
+
+Mientras una entrada siga vigente (con ``margin`` segundos de resguardo) la
+página no necesita volver a abrirse en Chrome.
+
+``FailureCache`` es el caso inverso: páginas que no dieron stream. Cada fallo
+duplica la espera antes del próximo intento (``base`` .. ``max_backoff``),
+pero nunca más allá del inicio del partido (menos ``lead``), para que la
+página vuelva a probarse cuando el evento está por empezar.
+
+``SuccessStats`` lleva aciertos/intentos por host para priorizar las fuentes
+que suelen funcionar, ``LifetimeStats`` cuánto duraron de verdad los streams
+sin vencimiento declarado (para usarlo en vez de ``default_ttl``), y ``HlsRuleMemory`` qué regla MPD -> HLS funcionó en
+cada host (ver dash_manifest.py).
+"""
+from __future__ import annotations
+
+import abc
+import base64
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_TTL = 20 * 60        # segundos, si la URL no dice cuándo vence
+MARGIN = 120                 # no servir entradas a menos de esto de vencer
+BACKOFF_BASE = 30 * 60       # primer castigo tras un fallo (una corrida del cron)
+BACKOFF_MAX = 12 * 60 * 60   # tope del backoff exponencial
+KICKOFF_LEAD = 15 * 60       # reintentar desde esto antes del inicio del partido
+STATS_MAX_AGE = 14 * 24 * 60 * 60  # olvidar hosts sin uso en dos semanas
+LIFETIME_SAMPLES = 5         # duraciones observadas que se recuerdan por host
+# Piso de la duración estimada: por debajo, una entrada vencería al guardarse
+# (MARGIN) o antes de que el daemon alcance a refrescarla (REFRESH_LEAD en refresh.py)
+LIFETIME_MIN = 10 * 60
+EXPIRY_PARAMS = ("expires", "exp", "e", "expiry", "validto", "hdnts_exp")
+
+JWT_RE = re.compile(r"eyJ[\w-]+\.(eyJ[\w-]+)\.[\w\-=]+")
+
+# ---------------------------------------------------------------------------
+# Vencimiento a partir de la URL
+# ---------------------------------------------------------------------------
+
+def _epoch(value) -> Optional[float]:
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        return None
+    if ts > 1e12:  # milisegundos
+        ts /= 1000
+    return ts if ts > 1e9 else None
+
+
+def jwt_expiry(url: str) -> Optional[float]:
+    """``exp`` del primer JWT embebido en la URL (epoch en segundos)."""
+    for m in JWT_RE.finditer(url):
+        payload = m.group(1)
+        try:
+            data = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except (ValueError, TypeError):
+            continue
+        if isinstance(data, dict):
+            exp = _epoch(data.get("exp"))
+            if exp:
+                return exp
+    return None
+
+
+def query_expiry(url: str) -> Optional[float]:
+    """Vencimiento desde parámetros de query (``expires=``, ``exp=``, ``e=``...)."""
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key.lower() in EXPIRY_PARAMS:
+            exp = _epoch(value)
+            if exp:
+                return exp
+    return None
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """El vencimiento más cercano declarado en la URL, o None si no declara ninguno."""
+    found = [e for e in (jwt_expiry(url), query_expiry(url)) if e]
+    return min(found) if found else None
+
+# ---------------------------------------------------------------------------
+# Caché
+# ---------------------------------------------------------------------------
+
+class _JsonCache(abc.ABC):
+    """Base: diccionario persistente en un JSON, con lock y guardado atómico.
+    Cada subclase define cuándo una entrada deja de servir (``_expired``)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    @abc.abstractmethod
+    def _expired(self, entry: dict, now: float) -> bool:
+        """True si ``entry`` ya no sirve a la hora ``now`` (se descarta al purgar)."""
+
+    def purge(self) -> None:
+        """Descarta entradas que ya no sirven."""
+        now = time.time()
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if not self._expired(v, now)}
+
+    def save(self) -> None:
+        """Escribe el JSON de forma atómica (archivo temporal + rename)."""
+        self.purge()
+        with self._lock:
+            data = json.dumps(self._entries, ensure_ascii=False, indent=1)
+        # temporal único por hilo: varios hilos pueden guardar a la vez
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(data, encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+class StreamCache(_JsonCache):
+    """Mapa persistente ``page_url -> {"stream", "expires", "stored", "source"}`` en un JSON."""
+
+    def __init__(self, path: Path, default_ttl: float = DEFAULT_TTL, margin: float = MARGIN):
+        super().__init__(path)
+        self.default_ttl = default_ttl
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return entry.get("expires", 0) <= now
+
+    def get(self, key: str) -> Optional[dict]:
+        """Stream vigente para ``key`` o None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.get("expires", 0) - self.margin > time.time():
+                self.hits += 1
+                return entry["stream"]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, stream: dict, ttl: Optional[float] = None) -> float:
+        """Guarda ``stream`` y devuelve su vencimiento (epoch). ``source`` anota de
+        dónde salió: ``token`` (la URL), ``ttl`` (el pasado) o ``default``."""
+        now = time.time()
+        expires = url_expiry(stream.get("url", ""))
+        source = "token"
+        if expires is None:
+            source = "ttl" if ttl is not None else "default"
+            expires = now + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            self._entries[key] = {"stream": stream, "expires": expires, "stored": now, "source": source}
+        return expires
+
+    def update(self, key: str, stream: dict) -> None:
+        """Reemplaza el stream de ``key`` (p.ej. con una medición nueva) sin
+        tocar su vencimiento."""
+        with self._lock:
+            if key in self._entries:
+                self._entries[key]["stream"] = stream
+
+    def drop(self, key: str) -> Optional[dict]:
+        """Descarta la entrada de ``key`` (p.ej. el stream dejó de reproducir) y la devuelve."""
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def items(self) -> list:
+        """Copia de ``(key, {"stream", "expires", "stored", "source"})`` de todas las entradas."""
+        with self._lock:
+            return list(self._entries.items())
+
+
+class FailureCache(_JsonCache):
+    """Mapa persistente ``page_url -> {"failures", "retry_at", "last"}``
+    de páginas sin stream, con backoff exponencial acotado por el kickoff."""
+
+    def __init__(self, path: Path, base: float = BACKOFF_BASE,
+                 max_backoff: float = BACKOFF_MAX, lead: float = KICKOFF_LEAD):
+        super().__init__(path)
+        self.base = base
+        self.max_backoff = max_backoff
+        self.lead = lead
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        # Olvidar fallos viejos: ya pasó el reintento y un backoff máximo más
+        return entry.get("retry_at", 0) + self.max_backoff < now
+
+    def should_skip(self, key: str) -> bool:
+        """True si la página falló hace poco y todavía no le toca reintentar."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return bool(entry) and entry.get("retry_at", 0) > time.time()
+
+    def record_failure(self, key: str, kickoff: Optional[float] = None) -> float:
+        """Anota un fallo y devuelve el epoch a partir del cual se puede reintentar.
+        Los fallos antes del kickoff no suben el backoff: casi ninguna página
+        tiene stream antes del partido, y sumarlos dejaría la página en backoff
+        justo durante el partido."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key, {"failures": 0})
+            failures = entry["failures"]
+            if kickoff and now < kickoff:
+                # Antes del partido, volver a probar cuando esté por empezar
+                delay = self.base * 2 ** max(failures - 1, 0)
+                retry_at = min(now + min(delay, self.max_backoff), kickoff - self.lead)
+            else:
+                failures += 1
+                retry_at = now + min(self.base * 2 ** (failures - 1), self.max_backoff)
+            self._entries[key] = {"failures": failures, "retry_at": retry_at, "last": now}
+        return retry_at
+
+    def record_success(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SuccessStats(_JsonCache):
+    """Mapa persistente ``host -> {"ok", "total", "last"}`` de resoluciones."""
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return entry.get("last", 0) + STATS_MAX_AGE < now
+
+    def record(self, host: str, ok: bool) -> None:
+        with self._lock:
+            entry = self._entries.setdefault(host, {"ok": 0, "total": 0})
+            entry["ok"] += int(ok)
+            entry["total"] += 1
+            entry["last"] = time.time()
+
+    def rate(self, host: str) -> float:
+        """Tasa de éxito suavizada (Laplace): 0.5 para hosts sin historia."""
+        with self._lock:
+            entry = self._entries.get(host, {"ok": 0, "total": 0})
+            return (entry["ok"] + 1) / (entry["total"] + 2)
+
+
+class LifetimeStats(_JsonCache):
+    """Mapa persistente ``host -> {"lifetimes": [segundos...], "last"}`` con las
+    duraciones observadas de streams cuya URL no declara vencimiento."""
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return entry.get("last", 0) + STATS_MAX_AGE < now
+
+    def observe(self, host: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._entries.setdefault(host, {"lifetimes": []})
+            entry["lifetimes"] = (entry["lifetimes"] + [round(seconds)])[-LIFETIME_SAMPLES:]
+            entry["last"] = time.time()
+
+    def estimate(self, host: str) -> Optional[float]:
+        """La mediana de las duraciones observadas (una muestra rara no manda),
+        nunca menos de ``LIFETIME_MIN``; None sin historia."""
+        with self._lock:
+            lifetimes = sorted(self._entries.get(host, {}).get("lifetimes") or [])
+        if not lifetimes:
+            return None
+        return float(max(lifetimes[len(lifetimes) // 2], LIFETIME_MIN))
+
+
+class HlsRuleMemory(_JsonCache):
+    """Mapa persistente ``host -> {"rule", "source", "last"}``: la última regla
+    MPD -> HLS que funcionó y sobre qué URL (original, final o base)."""
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return entry.get("last", 0) + STATS_MAX_AGE < now
+
+    def get(self, host: str) -> Optional[tuple]:
+        """``(regla, fuente)`` recordada para ``host`` o None."""
+        with self._lock:
+            entry = self._entries.get(host)
+            return (entry["rule"], entry.get("source", "original")) if entry else None
+
+    def remember(self, host: str, rule: str, source: str = "original") -> None:
+        with self._lock:
+            self._entries[host] = {"rule": rule, "source": source, "last": time.time()}
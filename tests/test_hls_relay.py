@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+test_hls_relay.py – Pruebas del relay HLS/DASH contra un origen de mentira
+
+Levanta un origen local que exige el Referer capturado (403 si falta) y
+cuenta las descargas por ruta, y un ``RelayServer`` delante. Verifica que:
+
+* los playlists maestro/media y el MPD salen reescritos hacia el relay,
+* el relay inyecta las cabeceras capturadas en cada pedido al origen,
+* con N espectadores a la vez cada segmento se baja una sola vez,
+* no se hace de proxy abierto hacia hosts ajenos al stream.
+
+Sin red ni navegador, desde la raíz del repo::
+
+    python -m unittest discover tests
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin
+
+import hls_relay
+
+REFERER = "https://player.example/"
+VIEWERS = 10
+SEGMENT = b"S" * 1000
+
+MASTER = b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360\nlow/index.m3u8?tok=1\n"
+MEDIA = (b"#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-KEY:METHOD=AES-128,URI=\"/keys/k.key\"\n"
+         b"#EXTINF:2,\nseg1.ts\n#EXTINF:2,\nseg2.ts?sig=abc\n")
+MPD = (b'<?xml version="1.0"?><MPD type="dynamic"><Period><AdaptationSet><Representation id="v">'
+       b'<SegmentTemplate media="seg-$Number$.m4s?k=1" initialization="init.mp4" startNumber="1"/>'
+       b'</Representation></AdaptationSet></Period></MPD>')
+
+# ---------------------------------------------------------------------------
+# Origen de mentira
+# ---------------------------------------------------------------------------
+
+class OriginHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        with self.server.lock:
+            self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.headers.get("Referer") != REFERER:
+            self.send_response(403)
+            self.end_headers()
+            return
+        if self.path.startswith("/live/master.m3u8"):
+            body, content_type = MASTER, "application/vnd.apple.mpegurl"
+        elif self.path.startswith("/live/low/index.m3u8"):
+            body, content_type = MEDIA, "application/vnd.apple.mpegurl"
+        elif self.path.startswith("/dash/m.mpd"):
+            body, content_type = MPD, "application/dash+xml"
+        else:
+            time.sleep(0.2)  # segmento lento: los espectadores se superponen
+            body, content_type = SEGMENT, "video/mp2t"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args) -> None:
+        pass
+
+
+def _serve(server: ThreadingHTTPServer) -> str:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return "http://%s:%d" % server.server_address[:2]
+
+
+def _get(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=10) as resp:
+        return resp.read()
+
+
+def _relay_lines(text: str):
+    return [line for line in text.splitlines() if line.startswith(hls_relay.PREFIX)]
+
+# ---------------------------------------------------------------------------
+# Pruebas
+# ---------------------------------------------------------------------------
+
+class RelayTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.origin_server = ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+        self.origin_server.hits, self.origin_server.lock = {}, threading.Lock()
+        self.origin = _serve(self.origin_server)
+        self.relay_server = hls_relay.RelayServer(("127.0.0.1", 0))
+        self.relay = _serve(self.relay_server)
+
+    def tearDown(self) -> None:
+        for server in (self.relay_server, self.origin_server):
+            server.shutdown()
+            server.server_close()
+
+    def _register(self, path: str) -> str:
+        stream = {"url": self.origin + path, "referer": REFERER}
+        return self.relay + self.relay_server.relay.register("s1", stream)
+
+    def _media(self) -> str:
+        master = _get(self._register("/live/master.m3u8")).decode()
+        return self.relay + _relay_lines(master)[0]
+
+    def test_rewrites_playlists(self):
+        master = _get(self._register("/live/master.m3u8")).decode()
+        self.assertIn("#EXT-X-STREAM-INF:BANDWIDTH=800000", master)
+        self.assertNotIn(self.origin, master)
+        self.assertEqual(len(_relay_lines(master)), 1)
+
+        media = _get(self.relay + _relay_lines(master)[0]).decode()
+        self.assertNotIn(self.origin, media)
+        self.assertEqual(len(_relay_lines(media)), 2)
+        key = re.search(r'URI="([^"]+)"', media).group(1)
+        self.assertTrue(key.startswith(hls_relay.PREFIX))
+        self.assertEqual(_get(self.relay + key), SEGMENT)
+
+    def test_injects_captured_headers(self):
+        # Directo al origen sin Referer: 403; a través del relay: 200
+        with self.assertRaises(urllib.error.HTTPError) as err:
+            _get(self.origin + "/live/master.m3u8")
+        self.assertEqual(err.exception.code, 403)
+        media = _get(self._media()).decode()
+        for line in _relay_lines(media):
+            self.assertEqual(_get(self.relay + line), SEGMENT)
+
+    def test_one_upstream_fetch_per_segment(self):
+        media_url = self._media()
+        segments = _relay_lines(_get(media_url).decode())
+        results, lock = [], threading.Lock()
+
+        def viewer():
+            _get(media_url)
+            for line in segments:
+                data = _get(self.relay + line)
+                with lock:
+                    results.append(data)
+
+        threads = [threading.Thread(target=viewer) for _ in range(VIEWERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [SEGMENT] * VIEWERS * len(segments))
+        hits = self.origin_server.hits
+        self.assertEqual(hits["/live/low/seg1.ts"], 1)
+        self.assertEqual(hits["/live/low/seg2.ts?sig=abc"], 1)
+
+    def test_rejects_foreign_hosts(self):
+        self._register("/live/master.m3u8")
+        path = hls_relay.PREFIX + "s1/" + hls_relay.encode_target("http://other.invalid/a.ts")
+        with self.assertRaises(urllib.error.HTTPError) as err:
+            _get(self.relay + path)
+        self.assertEqual(err.exception.code, 403)
+
+    def test_relays_dash(self):
+        url = self._register("/dash/m.mpd")
+        self.assertTrue(url.endswith("index.mpd"))
+        with urllib.request.urlopen(url, timeout=10) as resp:
+            final, mpd = resp.url, resp.read().decode()
+        self.assertNotIn(self.origin, mpd)
+        base = re.search(r"<BaseURL>(.*?)</BaseURL>", mpd).group(1)
+        self.assertEqual(_get(urljoin(final, urljoin(base, "seg-1.m4s?k=1"))), SEGMENT)
+        self.assertEqual(self.origin_server.hits["/dash/seg-1.m4s?k=1"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()